@@ -1,16 +1,61 @@
-from services.gemini_service import GeminiService
-from utils.prompt_templates import PromptTemplates
+from services.gemini_service import GeminiService, Priority, StructuredOutputError, get_gemini_service
+from utils.prompt_templates import PromptTemplates, PromptProfiles
 from schemas.request_models import DiseaseRequest
-from schemas.response_models import DiseaseResponse
-import image2disease
-import json
+from schemas.response_models import DiseaseResponse, LabelPrediction
+from services.inference_service import get_inference_service
+from services.translation_service import TranslationService
+from services.diagnosis_cache import DiagnosisCache
+from config import (IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_MAX_DISTANCE,
+                    DIAGNOSIS_MIN_CONFIDENCE, DIAGNOSIS_HEALTHY_MIN_CONFIDENCE)
+from utils.image_fingerprint import DHASH_DRAFT_SIZE, ImageFingerprintCache, content_hash, dhash
+from image2disease import _open_image, read_image_bytes
+from utils.singleflight import SingleFlight
+from utils.metrics import metrics
+import asyncio
+from typing import Any, List, Tuple
+
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 0.95, 0.99, 1.0)
 
 class DiseaseAgent:
-    def __init__(self):
-        self.gemini_service = GeminiService()
+    def __init__(self, gemini_service: GeminiService = None, translation_service: TranslationService = None):
+        self.gemini_service = gemini_service or get_gemini_service()
+        self.translation_service = translation_service or TranslationService(self.gemini_service)
+        self.inference_service = get_inference_service()
+        
+        # Image diagnoses only depend on the classifier label, so cache them
+        # per (label, language) and persist them across restarts
+        self.diagnosis_cache = DiagnosisCache()
+        self.diagnosis_flights = SingleFlight()
+        # Classifier predictions of recent uploads, so re-uploads and near-identical
+        # copies of a photo skip decoding and inference
+        self.image_cache = ImageFingerprintCache(IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_MAX_DISTANCE)
+        # Top-1 probabilities, for tuning the thresholds, and diagnoses answered without Gemini
+        self.confidence_histogram = metrics.histogram("classifier_confidence", CONFIDENCE_BUCKETS)
+        self.shortcut_counters = {
+            reason: metrics.counter(f"diagnosis_shortcuts.{reason}") for reason in ("low_confidence", "healthy")
+        }
     
     async def diagnose(self, request: DiseaseRequest) -> DiseaseResponse:
         """Diagnose plant disease based on symptoms"""
+        try:
+            return await self._request_diagnosis(request)
+        except StructuredOutputError as e:
+            # Fallback handling if JSON parsing fails
+            return self._fallback_diagnosis(request.plant_name)
+    
+    def _fallback_diagnosis(self, plant_name: str) -> DiseaseResponse:
+        """Generic response used when the LLM output can't be parsed"""
+        return DiseaseResponse(
+            plant_name=plant_name,
+            possible_diseases=["Could not determine based on provided information"],
+            recommendations=["Consult a local agricultural extension service"],
+            preventive_measures=["Regular inspection of plants"],
+            organic_solutions=["Natural pest deterrents"],
+            chemical_solutions=["Use appropriate fungicides or pesticides as advised by experts"]
+        )
+    
+    async def _request_diagnosis(self, request: DiseaseRequest, priority: Priority = Priority.USER_FACING) -> DiseaseResponse:
+        """Ask Gemini for a diagnosis as schema-constrained JSON"""
         
         # Format the prompt with the request data
         prompt = PromptTemplates.DISEASE_DIAGNOSIS.format(
@@ -32,96 +77,244 @@ class DiseaseAgent:
         }
         """
         
-        # Get the response from Gemini
-        response_text = await self.gemini_service.generate_content(prompt, system_instruction)
+        # Get the response from Gemini, parsed straight into the response model
+        return await self.gemini_service.generate_structured(
+            prompt, DiseaseResponse, PromptProfiles.DISEASE_DIAGNOSIS, system_instruction, priority
+        )
+    
+    async def diagnose_from_image(self, image_data, language: str = "en") -> DiseaseResponse:
+        """
+        Diagnose plant disease based on image
+        
+        Args:
+            image_data: Raw image bytes
+            language: "en" for English or "bn" for a Bangla response
+        """
         
-        # Extract JSON from the response
         try:
-            # Sometimes Gemini might wrap the JSON in markdown code blocks, so let's handle that
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].strip()
-            else:
-                json_str = response_text
-            
-            response_data = json.loads(json_str)
-            return DiseaseResponse(**response_data)
+            digest, image_hash, prediction = await self._lookup_image(image_data)
+            if prediction is None:
+                # Get the raw prediction, batched with any concurrent uploads
+                prediction = await self.inference_service.classify(image_data)
+                self.image_cache.set(digest, image_hash, prediction)
+            return await self.diagnose_prediction(prediction, language)
         except Exception as e:
-            # Fallback handling if JSON parsing fails
-            return DiseaseResponse(
-                plant_name=request.plant_name,
-                possible_diseases=["Could not determine based on provided information"],
-                recommendations=["Consult a local agricultural extension service"],
-                preventive_measures=["Regular inspection of plants"],
-                organic_solutions=["Natural pest deterrents"],
-                chemical_solutions=["Use appropriate fungicides or pesticides as advised by experts"]
-            )
+            # Fallback handling if image processing fails
+            print(f"Image diagnosis failed, returning the fallback: {type(e).__name__}: {str(e)}")
+            fallback = self._image_fallback_diagnosis()
+            try:
+                return await self._localize(fallback, language)
+            except Exception as e:
+                print(f"Could not translate the image diagnosis fallback: {str(e)}")
+                return fallback
+    
+    def _image_fallback_diagnosis(self) -> DiseaseResponse:
+        """Generic response used when an image can't be classified or diagnosed"""
+        return DiseaseResponse(
+            plant_name="Unknown",
+            possible_diseases=["Could not determine from image"],
+            recommendations=["Upload a clearer image", "Try describing the symptoms manually"],
+            preventive_measures=["Regular inspection of plants"],
+            organic_solutions=["Natural pest deterrents"],
+            chemical_solutions=["Use appropriate fungicides or pesticides as advised by experts"]
+        )
+    
+    async def diagnose_images(self, images: List[Any], language: str = "en") -> List[Any]:
+        """
+        Diagnose a group of images at once
+        
+        All images are classified in one forward pass. Images that need an LLM
+        diagnosis are diagnosed concurrently under the Gemini rate limit, and
+        images with the same label share one diagnosis.
+        
+        Args:
+            images: Raw image bytes, one entry per image
+            language: "en" for English or "bn" for Bangla responses
+        
+        Returns:
+            list: One DiseaseResponse per image, or the exception raised for that image
+        """
+        lookups = await asyncio.gather(*[self._lookup_image(image) for image in images], return_exceptions=True)
+        predictions = [lookup if isinstance(lookup, Exception) else lookup[2] for lookup in lookups]
+        
+        # Only images that aren't fingerprint hits go through the classifier
+        misses = [i for i, prediction in enumerate(predictions) if prediction is None]
+        if misses:
+            classified = await self.inference_service.classify_many([images[i] for i in misses])
+            for i, prediction in zip(misses, classified):
+                predictions[i] = prediction
+                if not isinstance(prediction, Exception):
+                    digest, image_hash, _ = lookups[i]
+                    self.image_cache.set(digest, image_hash, prediction)
+        
+        # Concurrent diagnoses of the same label are coalesced by diagnose_label
+        diagnoses = await asyncio.gather(
+            *[self.diagnose_prediction(prediction, language)
+              for prediction in predictions if not isinstance(prediction, Exception)],
+            return_exceptions=True
+        )
+        diagnoses = iter(diagnoses)
+        return [prediction if isinstance(prediction, Exception) else next(diagnoses) for prediction in predictions]
+    
+    async def diagnose_prediction(self, prediction: List[Tuple[str, float]], language: str = "en") -> DiseaseResponse:
+        """
+        Diagnosis for a classifier prediction, with its confidence attached
+        
+        Unclear images (top probability below DIAGNOSIS_MIN_CONFIDENCE) and
+        confidently healthy plants are answered from the label table without
+        asking Gemini; everything else gets the cached per-label diagnosis.
+        
+        Args:
+            prediction: Top-k (label, probability) pairs, most likely first
+            language: "en" for English or "bn" for a Bangla response
+        """
+        predicted_label, confidence = prediction[0]
+        self.confidence_histogram.observe(confidence)
+        
+        if confidence < DIAGNOSIS_MIN_CONFIDENCE:
+            self.shortcut_counters["low_confidence"].inc()
+            result = await self._localize(await self._unclear_diagnosis(prediction), language)
+        else:
+            label_info = await self.inference_service.get_label_info(predicted_label)
+            if label_info["is_healthy"] and confidence >= DIAGNOSIS_HEALTHY_MIN_CONFIDENCE:
+                self.shortcut_counters["healthy"].inc()
+                result = await self._localize(self._healthy_diagnosis(label_info), language)
+            else:
+                result = await self.diagnose_label(predicted_label, language)
+        
+        return result.copy(update={
+            "confidence": round(confidence, 4),
+            "top_predictions": [
+                LabelPrediction(label=label, probability=round(probability, 4)) for label, probability in prediction
+            ]
+        })
+    
+    async def _unclear_diagnosis(self, prediction: List[Tuple[str, float]]) -> DiseaseResponse:
+        """
+        Local response for an image the classifier isn't sure about, listing its best guesses
+        
+        The texts depend only on the labels (probabilities are returned in
+        top_predictions), so their translations are reused from the cache.
+        """
+        candidates = []
+        for label, _ in prediction:
+            label_info = await self.inference_service.get_label_info(label)
+            finding = "No disease detected" if label_info["is_healthy"] else label_info["disease_name"]
+            candidates.append(f"{label_info['plant_name']}: {finding}")
+        return DiseaseResponse(
+            plant_name="Unknown",
+            possible_diseases=candidates,
+            recommendations=[
+                "Upload a clear, well-lit photo of a single affected leaf",
+                "Try describing the symptoms manually"
+            ],
+            preventive_measures=["Regular inspection of plants"]
+        )
+    
+    def _healthy_diagnosis(self, label_info: dict) -> DiseaseResponse:
+        """Local response for a plant the classifier confidently sees as healthy"""
+        return DiseaseResponse(
+            plant_name=label_info["plant_name"],
+            possible_diseases=["No disease detected"],
+            recommendations=[
+                "Continue regular watering and feeding suited to the plant",
+                "Keep checking leaves for spots, discoloration or wilting"
+            ],
+            preventive_measures=[
+                "Regular inspection of plants",
+                "Remove weeds and fallen plant debris",
+                "Water at the base to keep leaves dry"
+            ]
+        )
+    
+    async def _localize(self, result: DiseaseResponse, language: str) -> DiseaseResponse:
+        """Translate a locally built response (served from the translation cache after the first time)"""
+        if language == "en":
+            return result
+        return DiseaseResponse(**await self.translation_service.translate_dict_to_bangla(result.dict()))
     
-    async def diagnose_from_image(self, image_data) -> DiseaseResponse:
-        """Diagnose plant disease based on image"""
+    async def _lookup_image(self, image_data):
+        """
+        Look an image up in the fingerprint cache, by exact content first and
+        then by perceptual similarity. Reading, hashing and decoding the
+        thumbnail run off the event loop.
+        
+        Returns:
+            tuple: (content hash, perceptual hash, cached prediction or None). The
+            perceptual hash is None on an exact hit, which never needs it, and
+            when near-duplicate matching is off.
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, self._lookup_image_sync, image_data)
+    
+    def _lookup_image_sync(self, image_data):
+        digest = content_hash(read_image_bytes(image_data))
+        prediction = self.image_cache.get_exact(digest)
+        if prediction is not None:
+            return digest, None, prediction
+        if not self.image_cache.near_duplicates:
+            # Exact matches only, so there is no thumbnail to decode
+            self.image_cache.record_miss()
+            return digest, None, None
+        
+        image_hash = dhash(_open_image(image_data, DHASH_DRAFT_SIZE))
+        prediction = self.image_cache.get_similar(image_hash)
+        if prediction is not None:
+            # Remember these exact bytes too, so a repeat is an exact hit
+            self.image_cache.set(digest, image_hash, prediction)
+        return digest, image_hash, prediction
+    
+    async def diagnose_label(self, predicted_label: str, language: str = "en",
+                             priority: Priority = Priority.USER_FACING) -> DiseaseResponse:
+        """Diagnosis for a classifier label, served from the diagnosis cache when possible"""
+        cache_key = f"{predicted_label}|{language}"
+        cached = await self.diagnosis_cache.get(cache_key)
+        if cached is not None:
+            return DiseaseResponse(**cached)
+        
+        # Concurrent uploads of the same disease share one LLM pipeline
+        return await self.diagnosis_flights.do(
+            cache_key, lambda: self._build_label_diagnosis(predicted_label, language, priority)
+        )
+    
+    async def _build_label_diagnosis(self, predicted_label: str, language: str,
+                                     priority: Priority) -> DiseaseResponse:
+        cache_key = f"{predicted_label}|{language}"
+        if language != "en":
+            english = await self.diagnose_label(predicted_label, "en", priority)
+            translated = await self.translation_service.translate_dict_to_bangla(english.dict())
+            result = DiseaseResponse(**translated)
+            # Only cache translations of real (cached) diagnoses, never of fallbacks
+            if await self.diagnosis_cache.get(f"{predicted_label}|en") is not None:
+                await self.diagnosis_cache.set(cache_key, result.dict())
+            return result
+        
+        # Resolve plant and disease names from the label metadata table
+        label_info = await self.inference_service.get_label_info(predicted_label)
+        if label_info["is_healthy"]:
+            disease_description = "The plant appears healthy with no visible signs of disease"
+        else:
+            disease_description = f"The plant appears to have {label_info['disease_name']}"
+        
+        request = DiseaseRequest(
+            plant_name=label_info["plant_name"],
+            disease_description=disease_description,
+            additional_info=f"Detected via automated image analysis. Original label: {predicted_label}"
+        )
         
         try:
-            # Use the image2disease module to get the raw prediction
-            predicted_label = image2disease.analyze_plant_image(image_data)
-            
-            # Use LLM to extract plant name and disease from the predicted label
-            extract_prompt = f"""
-            I have a plant disease prediction from an image classifier: "{predicted_label}"
-            
-            Please extract the plant name and disease name from this label. The format can vary, but typically 
-            it's something like "Plant_Disease" or "Plant Disease" or similar patterns.
-            
-            Return your answer as a JSON object with these fields:
-            1. plant_name: The name of the plant (e.g., "Tomato", "Apple")
-            2. disease_name: The name of the disease (e.g., "Bacterial Spot", "Rust")
-            """
-            
-            system_instruction = """
-            You are a helpful assistant specialized in plant pathology. Extract the plant name and disease name 
-            from the given label. Return only a valid JSON object with the requested fields.
-            """
-            
-            # Get the parsed information from Gemini
-            extraction_response = await self.gemini_service.generate_content(extract_prompt, system_instruction)
-            
-            # Parse the JSON response
-            try:
-                if "```json" in extraction_response:
-                    json_str = extraction_response.split("```json")[1].split("```")[0].strip()
-                elif "```" in extraction_response:
-                    json_str = extraction_response.split("```")[1].strip()
-                else:
-                    json_str = extraction_response
-                
-                extracted_data = json.loads(json_str)
-                
-                # Create a DiseaseRequest object using the extracted information
-                request = DiseaseRequest(
-                    plant_name=extracted_data.get("plant_name", "Unknown"),
-                    disease_description=f"The plant appears to have {extracted_data.get('disease_name', 'an unknown disease')}",
-                    additional_info=f"Detected via automated image analysis. Original label: {predicted_label}"
-                )
-                
-                # Use the existing diagnose method to get recommendations
-                return await self.diagnose(request)
-                
-            except Exception as e:
-                # If parsing failed, create a simple request with the raw label
-                request = DiseaseRequest(
-                    plant_name="Unknown",
-                    disease_description=f"The plant appears to have a disease. Model prediction: {predicted_label}",
-                    additional_info="Failed to parse model prediction into plant and disease names."
-                )
-                return await self.diagnose(request)
-                
-        except Exception as e:
-            # Fallback handling if image processing fails
-            return DiseaseResponse(
-                plant_name="Unknown",
-                possible_diseases=["Could not determine from image"],
-                recommendations=["Upload a clearer image", "Try describing the symptoms manually"],
-                preventive_measures=["Regular inspection of plants"],
-                organic_solutions=["Natural pest deterrents"],
-                chemical_solutions=["Use appropriate fungicides or pesticides as advised by experts"]
-            )
+            result = await self._request_diagnosis(request, priority)
+        except StructuredOutputError as e:
+            # Don't cache fallbacks, so the next request gets another chance
+            return self._fallback_diagnosis(request.plant_name)
+        await self.diagnosis_cache.set(cache_key, result.dict())
+        return result
+    
+    async def warm_diagnosis_cache(self, languages=("en", "bn")):
+        """Precompute diagnoses for every label the classifier can emit"""
+        label_table = await self.inference_service.get_label_table()
+        for label in label_table:
+            for language in languages:
+                try:
+                    await self.diagnose_label(label, language, Priority.BACKGROUND)
+                except Exception as e:
+                    print(f"Diagnosis cache warmup failed for {label} ({language}): {str(e)}")
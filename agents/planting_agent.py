@@ -1,21 +1,21 @@
-from services.gemini_service import GeminiService
+from services.gemini_service import GeminiService, StructuredOutputError, get_gemini_service
 from services.weather_service import WeatherService
-from utils.prompt_templates import PromptTemplates
+from utils.prompt_templates import PromptTemplates, PromptProfiles
 from schemas.request_models import PlantingPlanRequest
 from schemas.response_models import PlantingPlanResponse, PlantingRecommendation
-import json
+from utils.forecast_engine import aggregate_forecast
 
 class PlantingAgent:
-    def __init__(self):
-        self.gemini_service = GeminiService()
-        self.weather_service = WeatherService()
+    def __init__(self, gemini_service: GeminiService = None, weather_service: WeatherService = None):
+        self.gemini_service = gemini_service or get_gemini_service()
+        self.weather_service = weather_service or WeatherService()
     
     async def create_planting_plan(self, request: PlantingPlanRequest) -> PlantingPlanResponse:
         """Create a seasonal planting plan"""
         
         # Get current weather conditions
         try:
-            weather_data = await self.weather_service.get_weather_forecast(request.location, days=7)
+            weather_data = await self.weather_service.get_weather_forecast(request.location)
             weather_conditions = self._summarize_weather(weather_data)
         except Exception as e:
             weather_conditions = "Weather data unavailable. Providing general recommendations."
@@ -47,22 +47,12 @@ class PlantingAgent:
         }
         """
         
-        # Get the response from Gemini
-        response_text = await self.gemini_service.generate_content(prompt, system_instruction)
-        
-        # Extract JSON from the response
+        # Get the response from Gemini, parsed straight into the response model
         try:
-            # Sometimes Gemini might wrap the JSON in markdown code blocks, so let's handle that
-            if "```json" in response_text:
-                json_str = response_text.split("```json")[1].split("```")[0].strip()
-            elif "```" in response_text:
-                json_str = response_text.split("```")[1].strip()
-            else:
-                json_str = response_text
-            
-            response_data = json.loads(json_str)
-            return PlantingPlanResponse(**response_data)
-        except Exception as e:
+            return await self.gemini_service.generate_structured(
+                prompt, PlantingPlanResponse, PromptProfiles.PLANTING_PLAN, system_instruction
+            )
+        except StructuredOutputError as e:
             # Create a fallback response
             return PlantingPlanResponse(
                 location=request.location,
@@ -76,20 +66,4 @@ class PlantingAgent:
         if not weather_data or "list" not in weather_data:
             return "Weather data unavailable"
         
-        forecasts = weather_data["list"]
-        if not forecasts:
-            return "No forecast data available"
-        
-        # Extract some useful information
-        avg_temp = sum(day["main"]["temp"] for day in forecasts) / len(forecasts)
-        max_temp = max(day["main"]["temp_max"] for day in forecasts)
-        min_temp = min(day["main"]["temp_min"] for day in forecasts)
-        
-        precipitation_days = sum(1 for day in forecasts if 
-                                "rain" in day or 
-                                any(weather["main"] in ["Rain", "Snow", "Drizzle"] for weather in day["weather"]))
-        
-        summary = f"Average temperature: {avg_temp:.1f}°C (Range: {min_temp:.1f}°C to {max_temp:.1f}°C). "
-        summary += f"Precipitation expected on {precipitation_days} out of {len(forecasts)} days."
-        
-        return summary
+        return aggregate_forecast(weather_data).summary()
@@ -1,51 +1,27 @@
-from services.gemini_service import GeminiService
+from services.gemini_service import GeminiService, get_gemini_service
 from services.weather_service import WeatherService
-from utils.prompt_templates import PromptTemplates
+from utils.prompt_templates import PromptTemplates, PromptProfiles, compact_json
 from schemas.request_models import WeatherForecastRequest
 from schemas.response_models import WeatherForecastResponse, WeatherForecast
-import json
-from datetime import datetime
+from utils.forecast_engine import aggregate_forecast
+import asyncio
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+INTERPRETATION_SYSTEM_INSTRUCTION = (
+    "You are an agricultural meteorologist. Provide practical advice for gardeners and farmers based on the weather forecast."
+)
 
 class WeatherAgent:
-    def __init__(self):
-        self.gemini_service = GeminiService()
-        self.weather_service = WeatherService()
+    def __init__(self, gemini_service: GeminiService = None, weather_service: WeatherService = None):
+        self.gemini_service = gemini_service or get_gemini_service()
+        self.weather_service = weather_service or WeatherService()
     
     async def get_forecast_with_interpretation(self, request: WeatherForecastRequest) -> WeatherForecastResponse:
         """Get weather forecast with agricultural interpretation"""
         
         # Get weather forecast
         try:
-            weather_data = await self.weather_service.get_weather_forecast(request.location, days=request.days)
-            formatted_forecast = self._format_weather_data(weather_data)
-            
-            # Generate agricultural interpretation
-            prompt = PromptTemplates.WEATHER_INTERPRETATION.format(
-                location=request.location,
-                weather_data=json.dumps(formatted_forecast, indent=2)
-            )
-            
-            interpretation = await self.gemini_service.generate_content(
-                prompt,
-                system_instruction="You are an agricultural meteorologist. Provide practical advice for gardeners and farmers based on the weather forecast."
-            )
-            
-            # Create response object
-            forecasts = []
-            for day_data in formatted_forecast:
-                forecasts.append(WeatherForecast(
-                    date=day_data["date"],
-                    temperature_high=day_data["temperature_high"],
-                    temperature_low=day_data["temperature_low"],
-                    precipitation_chance=day_data["precipitation_chance"],
-                    description=day_data["description"]
-                ))
-            
-            return WeatherForecastResponse(
-                location=request.location,
-                forecasts=forecasts,
-                planting_advice=interpretation
-            )
+            return await self._interpret_forecast(request)
             
         except Exception as e:
             # Return a placeholder response if the weather service fails
@@ -55,33 +31,106 @@ class WeatherAgent:
                 planting_advice="Weather forecast unavailable. Please try again later."
             )
     
+    async def get_forecasts_with_interpretation(self, locations: List[str],
+                                                days: Optional[int] = 5) -> List[Any]:
+        """
+        Forecasts with agricultural interpretation for many locations at once
+        
+        Locations that resolve to the same grid cell share one weather fetch
+        and one Gemini call; distinct cells run concurrently under the rate limits.
+        
+        Returns:
+            list: One WeatherForecastResponse per location, or the exception raised for it
+        """
+        cells = await asyncio.gather(
+            *[self.weather_service.resolve_location(location) for location in locations],
+            return_exceptions=True
+        )
+        
+        # First location seen for each cell is the one sent upstream
+        representatives = {}
+        for location, cell in zip(locations, cells):
+            if not isinstance(cell, Exception):
+                representatives.setdefault(cell["key"], location)
+        
+        keys = list(representatives)
+        interpretations = await asyncio.gather(
+            *[self._interpret_forecast(WeatherForecastRequest(location=representatives[key], days=days))
+              for key in keys],
+            return_exceptions=True
+        )
+        by_key = dict(zip(keys, interpretations))
+        
+        results = []
+        for location, cell in zip(locations, cells):
+            result = cell if isinstance(cell, Exception) else by_key[cell["key"]]
+            if not isinstance(result, Exception):
+                result = result.copy(update={"location": location})
+            results.append(result)
+        return results
+    
+    async def _interpret_forecast(self, request: WeatherForecastRequest) -> WeatherForecastResponse:
+        forecast, formatted_forecast = await self.get_forecast(request)
+        
+        # Generate agricultural interpretation
+        interpretation = await self.gemini_service.generate_content(
+            self._build_interpretation_prompt(request.location, formatted_forecast),
+            system_instruction=INTERPRETATION_SYSTEM_INSTRUCTION,
+            profile=PromptProfiles.WEATHER_INTERPRETATION
+        )
+        
+        forecast.planting_advice = interpretation
+        return forecast
+    
+    async def get_forecast(self, request: WeatherForecastRequest) -> Tuple[WeatherForecastResponse, List[Dict[str, Any]]]:
+        """
+        Get the structured forecast without the agricultural interpretation
+        
+        Returns:
+            Tuple of the response (with empty planting_advice) and the daily
+            records used to build the interpretation prompt
+        """
+        weather_data = await self.weather_service.get_weather_forecast(request.location, days=request.days)
+        formatted_forecast = self._format_weather_data(weather_data)
+        
+        # Create response object
+        forecasts = []
+        for day_data in formatted_forecast:
+            forecasts.append(WeatherForecast(
+                date=day_data["date"],
+                temperature_high=day_data["temperature_high"],
+                temperature_low=day_data["temperature_low"],
+                precipitation_chance=day_data["precipitation_chance"],
+                description=day_data["description"]
+            ))
+        
+        forecast = WeatherForecastResponse(
+            location=request.location,
+            forecasts=forecasts,
+            planting_advice=""
+        )
+        return forecast, formatted_forecast
+    
+    async def stream_interpretation(self, location: str, formatted_forecast: List[Dict[str, Any]]) -> AsyncIterator[str]:
+        """Stream the agricultural interpretation of a forecast chunk by chunk"""
+        async for chunk in self.gemini_service.generate_content_stream(
+            self._build_interpretation_prompt(location, formatted_forecast),
+            system_instruction=INTERPRETATION_SYSTEM_INSTRUCTION,
+            profile=PromptProfiles.WEATHER_INTERPRETATION
+        ):
+            yield chunk
+    
+    def _build_interpretation_prompt(self, location: str, formatted_forecast: List[Dict[str, Any]]) -> str:
+        return PromptTemplates.WEATHER_INTERPRETATION.format(
+            location=location,
+            weather_data=compact_json(formatted_forecast)
+        )
+    
     def _format_weather_data(self, weather_data):
-        """Format the raw weather API data into a more usable structure"""
+        """Format the raw weather API data into daily entries in the location's timezone"""
         if not weather_data or "list" not in weather_data:
             return []
         
-        formatted_data = []
-        for day in weather_data["list"]:
-            # OpenWeatherMap provides forecasts in 3-hour intervals
-            # We'll simplify by grouping by date
-            date_str = datetime.fromtimestamp(day["dt"]).strftime("%Y-%m-%d")
-            
-            # Find or create the entry for this date
-            day_entry = next((item for item in formatted_data if item["date"] == date_str), None)
-            if not day_entry:
-                day_entry = {
-                    "date": date_str,
-                    "temperature_high": day["main"]["temp_max"],
-                    "temperature_low": day["main"]["temp_min"],
-                    "precipitation_chance": day["pop"] if "pop" in day else 0,
-                    "description": day["weather"][0]["description"] if "weather" in day and day["weather"] else "No data"
-                }
-                formatted_data.append(day_entry)
-            else:
-                # Update the existing entry with extremes
-                day_entry["temperature_high"] = max(day_entry["temperature_high"], day["main"]["temp_max"])
-                day_entry["temperature_low"] = min(day_entry["temperature_low"], day["main"]["temp_min"])
-                day_entry["precipitation_chance"] = max(day_entry["precipitation_chance"], 
-                                                       day["pop"] if "pop" in day else 0)
-        
-        return formatted_data
+        # OpenWeatherMap provides forecasts in 3-hour intervals; the forecast
+        # engine groups them into local calendar days in one vectorized pass
+        return aggregate_forecast(weather_data).to_daily_records()
@@ -0,0 +1,252 @@
+"""
+Micro-benchmarks for the hot paths, runnable offline: Gemini and
+OpenWeatherMap are replaced by the stubs in benchmarks/stubs.py.
+
+- image: image2disease.analyze_plant_image per-image latency, and
+  analyze_plant_images throughput at several batch sizes, on Test_image/
+- weather: WeatherAgent._format_weather_data and
+  PlantingAgent._summarize_weather on synthetic 40-slot and larger forecasts
+- translation: TranslationService.translate_dict_to_bangla latency and
+  Gemini call counts for the agents' response shapes, with a cold and a warm
+  translation cache
+
+Results are written as JSON. Pass an earlier results file with --compare to
+print the change in median time per benchmark.
+
+Usage:
+    python benchmarks/run_benchmarks.py
+    python benchmarks/run_benchmarks.py --only weather,translation
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/baseline.json
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+
+project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, project_dir)
+
+from benchmarks.stubs import RESPONSE_SHAPES, StubGeminiService, StubWeatherService, synthetic_forecast
+from config import INFERENCE_BACKEND, WARMUP_IMAGE_DIR
+
+SUITES = ("image", "weather", "translation")
+DEFAULT_RESULTS_DIR = os.path.join(project_dir, "benchmarks", "results")
+
+def summarize(samples):
+    """Timing statistics in milliseconds for a list of durations in seconds"""
+    ordered = sorted(samples)
+    return {
+        "rounds": len(ordered),
+        "median_ms": statistics.median(ordered) * 1000,
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "min_ms": ordered[0] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))] * 1000,
+        "stdev_ms": statistics.stdev(ordered) * 1000 if len(ordered) > 1 else 0.0
+    }
+
+def measure(fn, rounds, warmup=1):
+    """Time fn() over a number of rounds, after a few untimed warmup calls"""
+    for _ in range(warmup):
+        fn()
+    samples = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - started)
+    return summarize(samples)
+
+def bench_image(args):
+    """Classifier latency per image and throughput per batch size"""
+    import image2disease
+    from image2disease import list_images
+    if args.model:
+        image2disease.MODEL_NAME = args.model
+
+    image_paths = list_images(args.images)
+    if not image_paths:
+        return {"image": {"skipped": f"No images found in {args.images}"}}
+    try:
+        image2disease.get_model()
+    except Exception as e:
+        # No network and no local copy of the model
+        return {"image": {"skipped": f"Model could not be loaded: {str(e)}"}}
+
+    # Uploads arrive as bytes, so decoding is part of what is measured
+    images = []
+    for path in image_paths:
+        with open(path, "rb") as f:
+            images.append(f.read())
+
+    results = {}
+    position = iter(range(sys.maxsize))
+    single = measure(lambda: image2disease.analyze_plant_image(images[next(position) % len(images)]),
+                     rounds=max(args.rounds, len(images)), warmup=len(images))
+    results["image.analyze_plant_image"] = dict(single, images=len(images), backend=INFERENCE_BACKEND)
+
+    for batch_size in args.batch_sizes:
+        batch = [images[i % len(images)] for i in range(batch_size)]
+        stats = measure(lambda: image2disease.analyze_plant_images(batch), rounds=args.rounds)
+        stats["batch_size"] = batch_size
+        stats["per_image_ms"] = stats["median_ms"] / batch_size
+        stats["images_per_second"] = batch_size / (stats["median_ms"] / 1000)
+        results[f"image.analyze_plant_images.batch_{batch_size}"] = stats
+    return results
+
+def bench_weather(args):
+    """Forecast formatting and summarizing on synthetic payloads"""
+    from agents.planting_agent import PlantingAgent
+    from agents.weather_agent import WeatherAgent
+
+    gemini = StubGeminiService()
+    weather = StubWeatherService()
+    weather_agent = WeatherAgent(gemini, weather)
+    planting_agent = PlantingAgent(gemini, weather)
+
+    results = {}
+    for slots in args.forecast_slots:
+        payload = synthetic_forecast(slots)
+        for name, fn in (("weather.format_weather_data", weather_agent._format_weather_data),
+                         ("planting.summarize_weather", planting_agent._summarize_weather)):
+            stats = measure(lambda: fn(payload), rounds=args.rounds * 10, warmup=3)
+            results[f"{name}.{slots}_slots"] = dict(stats, slots=slots)
+    return results
+
+async def _bench_translation(args):
+    from services.translation_cache import TranslationCache
+    from services.translation_service import TranslationService
+
+    gemini = StubGeminiService(args.gemini_latency_ms)
+    results = {}
+    with tempfile.TemporaryDirectory() as cache_dir:
+        for shape, data in RESPONSE_SHAPES.items():
+            for batched in (True, False):
+                mode = "batched" if batched else "per_string"
+                cold, warm = [], []
+                calls = {}
+                for round_number in range(args.rounds):
+                    # A fresh translation cache per round, so the first call is cold
+                    cache = TranslationCache(os.path.join(cache_dir, f"{shape}-{mode}-{round_number}.sqlite3"))
+                    service = TranslationService(gemini, cache)
+                    gemini.reset()
+                    started = time.perf_counter()
+                    await service.translate_dict_to_bangla(data, batched=batched)
+                    cold.append(time.perf_counter() - started)
+                    calls = dict(gemini.calls)
+
+                    gemini.reset()
+                    started = time.perf_counter()
+                    await service.translate_dict_to_bangla(data, batched=batched)
+                    warm.append(time.perf_counter() - started)
+                    warm_calls = dict(gemini.calls)
+                    cache.db.close()
+
+                strings = []
+                service._collect_strings(data, strings)
+                results[f"translation.{shape}.{mode}.cold"] = dict(
+                    summarize(cold), strings=len(strings), gemini_calls=sum(calls.values()), calls=calls
+                )
+                results[f"translation.{shape}.{mode}.warm"] = dict(
+                    summarize(warm), strings=len(strings), gemini_calls=sum(warm_calls.values()), calls=warm_calls
+                )
+    return results
+
+def bench_translation(args):
+    """translate_dict_to_bangla latency and Gemini calls per response shape"""
+    # The unbatched path logs every string; keep that out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        return asyncio.run(_bench_translation(args))
+
+def environment():
+    """Where the results came from, so runs on different machines aren't mixed up"""
+    info = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "inference_backend": INFERENCE_BACKEND
+    }
+    try:
+        info["git_commit"] = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=project_dir,
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        info["git_commit"] = None
+    try:
+        import torch
+        info["torch"] = torch.__version__
+    except ImportError:
+        pass
+    return info
+
+def compare(previous, current):
+    """Print the change in median time for every benchmark present in both runs"""
+    print(f"\nCompared with {previous['environment'].get('git_commit')} "
+          f"({previous['environment'].get('timestamp')}):")
+    for name, stats in current["results"].items():
+        before = previous["results"].get(name, {})
+        if "median_ms" not in stats or "median_ms" not in before:
+            continue
+        ratio = stats["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        print(f"  {name:60} {before['median_ms']:10.3f} -> {stats['median_ms']:10.3f} ms ({ratio:.2f}x)")
+
+def parse_list(value, cast=str):
+    return [cast(item) for item in value.split(",") if item.strip()]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the offline micro-benchmarks and write the results as JSON")
+    parser.add_argument("--only", type=parse_list, default=list(SUITES),
+                        help=f"Comma-separated suites to run (default: {','.join(SUITES)})")
+    parser.add_argument("--rounds", type=int, default=20, help="Timed rounds per benchmark")
+    parser.add_argument("--batch-sizes", type=lambda v: parse_list(v, int), default=[1, 2, 4, 8, 16],
+                        help="Classifier batch sizes")
+    parser.add_argument("--forecast-slots", type=lambda v: parse_list(v, int), default=[40, 400, 4000],
+                        help="Sizes of the synthetic forecasts (40 = the 5-day API response)")
+    parser.add_argument("--gemini-latency-ms", type=float, default=0,
+                        help="Simulated latency of each stubbed Gemini call")
+    parser.add_argument("--images", default=WARMUP_IMAGE_DIR, help="Images for the classifier benchmarks")
+    parser.add_argument("--model", help="Hugging Face model id or local path (default: image2disease.MODEL_NAME)")
+    parser.add_argument("--output", help="Results file (default: benchmarks/results/benchmark-<time>.json)")
+    parser.add_argument("--compare", help="Earlier results file to compare against")
+    args = parser.parse_args()
+
+    unknown = set(args.only) - set(SUITES)
+    if unknown:
+        parser.error(f"Unknown suites: {', '.join(sorted(unknown))}")
+
+    suites = {"image": bench_image, "weather": bench_weather, "translation": bench_translation}
+    results = {}
+    for name in SUITES:
+        if name not in args.only:
+            continue
+        print(f"Running {name} benchmarks...")
+        for benchmark, stats in suites[name](args).items():
+            results[benchmark] = stats
+            if "skipped" in stats:
+                print(f"  {benchmark:60} skipped: {stats['skipped']}")
+            else:
+                print(f"  {benchmark:60} {stats['median_ms']:10.3f} ms (median of {stats['rounds']})")
+
+    report = {"environment": environment(), "results": results}
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"benchmark-{datetime.now().strftime('%Y%m%d-%H%M%S')}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Saved results to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""
+Offline stand-ins for the Gemini and OpenWeatherMap services, plus
+synthetic payloads shaped like the real responses
+"""
+import asyncio
+import json
+import re
+from collections import Counter
+import numpy as np
+
+JSON_BLOCK = re.compile(r"```json\s*(.*?)\s*```", re.DOTALL)
+CODE_BLOCK = re.compile(r"```\s*(.*?)\s*```", re.DOTALL)
+
+class StubGeminiService:
+    """
+    Answers like GeminiService without the network: translations are the
+    source text with a "[bn] " prefix. Calls are counted per method and
+    generation profile.
+    """
+    def __init__(self, latency_ms: float = 0):
+        self.latency = latency_ms / 1000
+        self.calls = Counter()
+
+    def reset(self):
+        self.calls.clear()
+
+    async def _respond(self, method: str, profile):
+        self.calls[f"{method}.{profile.name}"] += 1
+        # Yield to the event loop even without latency, like a real request
+        await asyncio.sleep(self.latency)
+
+    async def generate_content(self, prompt, system_instruction=None, priority=None, profile=None):
+        await self._respond("generate_content", profile)
+        match = CODE_BLOCK.search(prompt)
+        return f"[bn] {match.group(1) if match else prompt.strip()}"
+
+    async def generate_structured(self, prompt, schema, profile, system_instruction=None, priority=None, **kwargs):
+        await self._respond("generate_structured", profile)
+        match = JSON_BLOCK.search(prompt)
+        keyed = json.loads(match.group(1)) if match else {}
+        return {key: f"[bn] {value}" for key, value in keyed.items()}
+
+    async def generate_content_stream(self, prompt, system_instruction=None, priority=None, profile=None):
+        yield await self.generate_content(prompt, system_instruction, priority, profile)
+
+class StubWeatherService:
+    """Serves a fixed synthetic forecast for every location"""
+    def __init__(self, slots: int = 40):
+        self.forecast = synthetic_forecast(slots)
+
+    async def get_weather_forecast(self, location, days=None):
+        return self.forecast
+
+def synthetic_forecast(slots: int = 40, seed: int = 0, timezone: int = 21600):
+    """
+    An OpenWeatherMap /forecast response with `slots` 3-hourly entries
+    (40 slots is the API's 5-day horizon)
+    """
+    rng = np.random.default_rng(seed)
+    start = 1717200000  # 2024-06-01 00:00 UTC
+    hours = np.arange(slots) * 3
+    temperatures = 29 + 4 * np.sin((hours + timezone / 3600 - 9) / 24 * 2 * np.pi) + rng.normal(0, 0.8, slots)
+    conditions = [("Clear", "clear sky"), ("Clouds", "scattered clouds"), ("Clouds", "overcast clouds"),
+                  ("Rain", "light rain"), ("Rain", "moderate rain"), ("Thunderstorm", "thunderstorm with rain")]
+
+    entries = []
+    for i in range(slots):
+        main, description = conditions[int(rng.integers(len(conditions)))]
+        entry = {
+            "dt": start + i * 3 * 3600,
+            "main": {
+                "temp": round(float(temperatures[i]), 2),
+                "temp_max": round(float(temperatures[i] + rng.uniform(0, 1.5)), 2),
+                "temp_min": round(float(temperatures[i] - rng.uniform(0, 1.5)), 2),
+                "humidity": int(rng.integers(55, 95))
+            },
+            "weather": [{"main": main, "description": description}],
+            "pop": round(float(rng.uniform(0.6, 1.0) if main in ("Rain", "Thunderstorm") else rng.uniform(0, 0.3)), 2)
+        }
+        if main in ("Rain", "Thunderstorm"):
+            entry["rain"] = {"3h": round(float(rng.uniform(0.1, 8.0)), 2)}
+        entries.append(entry)
+
+    return {
+        "cod": "200",
+        "cnt": slots,
+        "list": entries,
+        "city": {"name": "Dhaka", "country": "BD", "coord": {"lat": 23.8103, "lon": 90.4125}, "timezone": timezone}
+    }
+
+# Response shapes as returned by the agents, for the translation benchmarks
+DISEASE_RESPONSE = {
+    "plant_name": "Tomato",
+    "possible_diseases": ["Early blight (Alternaria solani)", "Septoria leaf spot"],
+    "recommendations": [
+        "Remove and destroy infected lower leaves as soon as spots appear.",
+        "Water at the base of the plant in the morning so the foliage dries quickly.",
+        "Stake or cage plants to improve air circulation."
+    ],
+    "preventive_measures": [
+        "Rotate tomatoes with non-solanaceous crops for at least two seasons.",
+        "Mulch around plants to stop soil splashing onto the leaves.",
+        "Space plants 60 cm apart."
+    ],
+    "organic_solutions": [
+        "Spray copper-based fungicide every 7 to 10 days during wet weather.",
+        "Apply neem oil or a Bacillus subtilis biofungicide."
+    ],
+    "chemical_solutions": [
+        "Apply chlorothalonil or mancozeb according to the label.",
+        "Alternate fungicide groups to slow resistance."
+    ]
+}
+
+PLANTING_PLAN_RESPONSE = {
+    "location": "Dhaka",
+    "season": "Monsoon",
+    "recommendations": [
+        {
+            "plant_name": plant,
+            "suitable_time": "Mid June to late July",
+            "growing_conditions": "Well-drained loamy soil with full sun. Raised beds help during heavy rain.",
+            "care_instructions": "Water only when the topsoil is dry. Apply compost every three weeks and watch for fungal spots."
+        }
+        for plant in ("Okra", "Amaranth", "Bottle gourd", "Cucumber", "Eggplant")
+    ],
+    "general_advice": (
+        "Heavy rain is expected for most of the week, so prepare drainage channels before planting. "
+        "Delay fertilizer application until after the rain. Check seedlings daily for damping-off."
+    )
+}
+
+WEATHER_FORECAST_RESPONSE = {
+    "location": "Dhaka",
+    "forecasts": [
+        {"date": f"2024-06-0{day}", "temperature_high": 33.1, "temperature_low": 26.4,
+         "precipitation_chance": 0.8, "description": description}
+        for day, description in zip(range(1, 6), ("light rain", "moderate rain", "overcast clouds",
+                                                  "thunderstorm with rain", "scattered clouds"))
+    ],
+    "planting_advice": (
+        "Rain on four of the next five days keeps the soil moist, so skip irrigation. "
+        "Transplant seedlings on the drier third day. High humidity favors fungal diseases; "
+        "inspect leaves every morning and remove any with spots. Avoid spraying before thunderstorms."
+    )
+}
+
+RESPONSE_SHAPES = {
+    "disease_response": DISEASE_RESPONSE,
+    "planting_plan_response": PLANTING_PLAN_RESPONSE,
+    "weather_forecast_response": WEATHER_FORECAST_RESPONSE
+}
@@ -13,3 +13,68 @@ WEATHER_RATE_LIMIT = int(os.getenv("WEATHER_RATE_LIMIT", "60"))  # requests per
 
 # Model settings
 GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.0-flash")
+STRUCTURED_OUTPUT_MAX_REPAIRS = int(os.getenv("STRUCTURED_OUTPUT_MAX_REPAIRS", "1"))  # repair calls when JSON output doesn't validate
+
+# Image inference settings
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_WAIT_MS = float(os.getenv("INFERENCE_MAX_WAIT_MS", "10"))  # milliseconds
+INFERENCE_EXECUTOR = os.getenv("INFERENCE_EXECUTOR", "thread")  # "thread", "process" or "fork"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "0"))  # 0 = split CPU cores across workers
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")  # "torch", "torchscript" or "onnx"
+CLASSIFIER_TOP_K = int(os.getenv("CLASSIFIER_TOP_K", "3"))  # labels with probabilities returned per image
+DIAGNOSIS_MIN_CONFIDENCE = float(os.getenv("DIAGNOSIS_MIN_CONFIDENCE", "0.5"))  # below this, report the image as unclear without calling Gemini; 0 disables
+DIAGNOSIS_HEALTHY_MIN_CONFIDENCE = float(os.getenv("DIAGNOSIS_HEALTHY_MIN_CONFIDENCE", "0.8"))  # healthy predictions at or above this skip Gemini; above 1 disables
+MODEL_EXPORT_DIR = os.getenv("MODEL_EXPORT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "models"))
+TORCHSCRIPT_MODEL_PATH = os.getenv("TORCHSCRIPT_MODEL_PATH", os.path.join(MODEL_EXPORT_DIR, "classifier.torchscript.pt"))
+ONNX_MODEL_PATH = os.getenv("ONNX_MODEL_PATH", os.path.join(MODEL_EXPORT_DIR, "classifier.int8.onnx"))
+
+# Image upload settings
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_BYTES", str(15 * 1024 * 1024)))  # larger uploads are rejected with 413
+BATCH_UPLOAD_MAX_BYTES = int(os.getenv("BATCH_UPLOAD_MAX_BYTES", str(64 * 1024 * 1024)))  # whole batch request body
+
+# Startup warmup settings
+WARMUP_IMAGE_DIR = os.getenv("WARMUP_IMAGE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test_image"))
+WARMUP_ROUNDS = int(os.getenv("WARMUP_ROUNDS", "2"))
+
+# Cache settings
+CACHE_DIR = os.getenv("CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "cache"))
+DIAGNOSIS_CACHE_TTL = int(os.getenv("DIAGNOSIS_CACHE_TTL", str(7 * 24 * 3600)))  # seconds
+DIAGNOSIS_CACHE_MAX_ENTRIES = int(os.getenv("DIAGNOSIS_CACHE_MAX_ENTRIES", "512"))
+DIAGNOSIS_CACHE_PATH = os.getenv("DIAGNOSIS_CACHE_PATH", os.path.join(CACHE_DIR, "diagnosis_cache.sqlite3"))
+DIAGNOSIS_CACHE_WARMUP = os.getenv("DIAGNOSIS_CACHE_WARMUP", "false").lower() in ("1", "true", "yes")
+IMAGE_CACHE_MAX_ENTRIES = int(os.getenv("IMAGE_CACHE_MAX_ENTRIES", "1024"))  # fingerprinted uploads kept in memory
+IMAGE_CACHE_MAX_DISTANCE = int(os.getenv("IMAGE_CACHE_MAX_DISTANCE", "-1"))  # dHash bits; -1 = exact matches only
+TRANSLATION_CACHE_PATH = os.getenv("TRANSLATION_CACHE_PATH", os.path.join(CACHE_DIR, "translations.sqlite3"))
+TRANSLATION_CACHE_MEMORY_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MEMORY_ENTRIES", "4096"))
+TRANSLATION_BATCH_MAX_ITEMS = int(os.getenv("TRANSLATION_BATCH_MAX_ITEMS", "40"))
+TRANSLATION_BATCH_MAX_CHARS = int(os.getenv("TRANSLATION_BATCH_MAX_CHARS", "4000"))
+TRANSLATION_STREAM_CONCURRENCY = int(os.getenv("TRANSLATION_STREAM_CONCURRENCY", "4"))
+
+# Rate limiter settings
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")  # "memory" or "sqlite" (shared by all workers on a host)
+RATE_LIMIT_DB_PATH = os.getenv("RATE_LIMIT_DB_PATH", os.path.join(CACHE_DIR, "rate_limits.sqlite3"))
+GEMINI_RATE_BURST = int(os.getenv("GEMINI_RATE_BURST", "5"))  # calls allowed back to back
+WEATHER_RATE_BURST = int(os.getenv("WEATHER_RATE_BURST", "5"))
+
+# Weather HTTP client settings
+WEATHER_HTTP_MAX_CONNECTIONS = int(os.getenv("WEATHER_HTTP_MAX_CONNECTIONS", "10"))
+WEATHER_HTTP_MAX_KEEPALIVE = int(os.getenv("WEATHER_HTTP_MAX_KEEPALIVE", "10"))
+WEATHER_HTTP_KEEPALIVE_EXPIRY = float(os.getenv("WEATHER_HTTP_KEEPALIVE_EXPIRY", "60"))  # seconds
+WEATHER_HTTP_TIMEOUT = float(os.getenv("WEATHER_HTTP_TIMEOUT", "10"))  # seconds
+WEATHER_HTTP_CONNECT_TIMEOUT = float(os.getenv("WEATHER_HTTP_CONNECT_TIMEOUT", "5"))  # seconds
+WEATHER_HTTP2 = os.getenv("WEATHER_HTTP2", "false").lower() in ("1", "true", "yes")
+
+# Weather forecast cache settings
+WEATHER_CACHE_TTL = int(os.getenv("WEATHER_CACHE_TTL", str(3 * 3600)))  # seconds; OpenWeatherMap updates every 3 hours
+WEATHER_CACHE_STALE_TTL = int(os.getenv("WEATHER_CACHE_STALE_TTL", "3600"))  # seconds a stale forecast may be served while refreshing
+WEATHER_CACHE_MAX_ENTRIES = int(os.getenv("WEATHER_CACHE_MAX_ENTRIES", "1024"))
+
+# Geocoding settings
+GEOCODE_CACHE_PATH = os.getenv("GEOCODE_CACHE_PATH", os.path.join(CACHE_DIR, "geocode.sqlite3"))
+GEOCODE_GRID_DEGREES = float(os.getenv("GEOCODE_GRID_DEGREES", "0.1"))  # ~11 km grid cells
+GEOCODE_MEMORY_ENTRIES = int(os.getenv("GEOCODE_MEMORY_ENTRIES", "4096"))  # resolved locations kept in memory
+GEOCODE_NOT_FOUND_TTL = int(os.getenv("GEOCODE_NOT_FOUND_TTL", "600"))  # seconds an unknown location is remembered
+
+# Batch endpoint settings
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "64"))  # images or locations per batch request
@@ -0,0 +1,220 @@
+"""
+Export the disease classifier for the TorchScript and ONNX Runtime backends,
+and check an exported model on the bundled test images: its top-1 accuracy
+against the labels in the file names, and its top-1 agreement with eager
+PyTorch.
+
+Usage:
+    python export_model.py torchscript
+    python export_model.py onnx                      # int8, static quantization
+    python export_model.py onnx --quantization dynamic
+    python export_model.py onnx --quantization none  # fp32, saved as classifier.onnx
+    python export_model.py check --backend onnx      # re-run the check on every image
+    python export_model.py onnx --images calib/ --eval-dir holdout/
+
+Static quantization is calibrated on --images. After an export the check runs
+on --eval-dir, or, without it, on every other image of --images, which is then
+left out of calibration, so the check never sees a calibration image. The
+check command calibrates nothing and evaluates every image.
+
+The expected label of an image is the classifier label closest to its file
+name (e.g. tomato_target_spot.jpg -> Tomato___Target_Spot). Images whose
+name matches no label clearly only count towards agreement.
+
+Then start the server with INFERENCE_BACKEND=torchscript or INFERENCE_BACKEND=onnx.
+"""
+import argparse
+import difflib
+import os
+import re
+import sys
+import time
+
+project_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, project_dir)
+
+import model_backends
+from image2disease import MODEL_NAME, ImageTransform, _open_image, build_label_table, list_images
+from config import TORCHSCRIPT_MODEL_PATH, ONNX_MODEL_PATH, WARMUP_IMAGE_DIR
+
+# Fewer evaluation images than this can't tell a good export from a bad one
+MIN_EVAL_IMAGES = 10
+# A file name must be this similar to a label, and clearly closer to it than
+# to any other label, to count as ground truth
+LABEL_MATCH_MIN_RATIO = 0.8
+LABEL_MATCH_MARGIN = 0.05
+
+def split_images(image_paths, eval_dir=None):
+    """
+    Split images into (calibration, evaluation) sets with no image in both
+
+    Without an evaluation directory, every other image is held out for evaluation.
+    """
+    if eval_dir is None:
+        return image_paths[::2], image_paths[1::2]
+    eval_paths = list_images(eval_dir)
+    held_out = {os.path.realpath(path) for path in eval_paths}
+    return [path for path in image_paths if os.path.realpath(path) not in held_out], eval_paths
+
+def _words(text):
+    return re.sub(r"[\W_]+", " ", text).strip().lower()
+
+def expected_label(image_path, label_table):
+    """
+    Ground-truth label of an image from its file name, or None when the name
+    doesn't clearly match one label (e.g. "healthy_leaf.jpg" with several
+    healthy plants)
+    """
+    name = _words(os.path.splitext(os.path.basename(image_path))[0])
+    scores = []
+    for label, info in label_table.items():
+        spellings = (_words(label), _words(f"{info['plant_name']} {info['disease_name']}"))
+        scores.append((max(difflib.SequenceMatcher(None, name, spelling).ratio() for spelling in spellings), label))
+    scores.sort(reverse=True)
+    if not scores or scores[0][0] < LABEL_MATCH_MIN_RATIO:
+        return None
+    if len(scores) > 1 and scores[0][0] - scores[1][0] < LABEL_MATCH_MARGIN:
+        return None
+    return scores[0][1]
+
+def unquantized_path(path):
+    """Path for an fp32 export next to the int8 one: classifier.int8.onnx -> classifier.onnx"""
+    root, ext = os.path.splitext(path)
+    if root.endswith(".int8"):
+        return root[:-len(".int8")] + ext
+    return f"{root}.fp32{ext}"
+
+def preprocess(image_paths, transform):
+    """Decode and preprocess images into one batch, exactly as the server does"""
+    return transform([_open_image(path, transform.draft_size) for path in image_paths])
+
+def time_backend(backend, pixel_values, rounds=10):
+    """Average seconds per batch over a few rounds, after one warmup run"""
+    backend.predict(pixel_values)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        backend.predict(pixel_values)
+    return (time.perf_counter() - started) / rounds
+
+def check_agreement(backend, reference, image_paths, transform, id2label):
+    """
+    Compare top-1 predictions of a backend with the eager reference model,
+    and both with the labels in the image file names
+
+    Returns:
+        float: Fraction of images where both predict the same label
+    """
+    label_table = build_label_table(id2label)
+    pixel_values = preprocess(image_paths, transform)
+    expected = reference.predict(pixel_values).argmax(-1).tolist()
+    predicted = backend.predict(pixel_values).argmax(-1).tolist()
+
+    agreed = labeled = backend_correct = reference_correct = 0
+    for path, want, got in zip(image_paths, expected, predicted):
+        status = "ok" if want == got else "MISMATCH"
+        agreed += want == got
+        truth = expected_label(path, label_table)
+        if truth is not None:
+            labeled += 1
+            backend_correct += id2label[got] == truth
+            reference_correct += id2label[want] == truth
+        print(f"  {status:8} {os.path.basename(path)}: {id2label[got]} (torch: {id2label[want]}, "
+              f"expected: {truth or 'unknown'})")
+    agreement = agreed / len(image_paths)
+    print(f"Top-1 agreement with eager torch: {agreed}/{len(image_paths)} ({agreement:.0%})")
+    if labeled:
+        print(f"Top-1 accuracy on {labeled} labeled images: {backend.name} {backend_correct}/{labeled} "
+              f"({backend_correct / labeled:.0%}), torch {reference_correct}/{labeled} "
+              f"({reference_correct / labeled:.0%})")
+    else:
+        print("Top-1 accuracy: no image file name matches a classifier label")
+    if len(image_paths) < MIN_EVAL_IMAGES:
+        print(f"WARNING: only {len(image_paths)} evaluation images; figures from fewer than "
+              f"{MIN_EVAL_IMAGES} images say little about the export. Pass a larger --eval-dir.")
+
+    reference_time = time_backend(reference, pixel_values)
+    backend_time = time_backend(backend, pixel_values)
+    print(f"Batch of {len(image_paths)}: torch {reference_time * 1000:.1f} ms, "
+          f"{backend.name} {backend_time * 1000:.1f} ms ({reference_time / backend_time:.2f}x)")
+    return agreement
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the disease classifier for faster inference backends")
+    parser.add_argument("command", choices=["torchscript", "onnx", "check"],
+                        help="Export format, or 'check' to only compare an existing export")
+    parser.add_argument("--backend", choices=["torchscript", "onnx"],
+                        help="Backend to compare with 'check' (default: onnx)")
+    parser.add_argument("--model", default=MODEL_NAME, help="Hugging Face model id or local path")
+    parser.add_argument("--output", help="Output path (defaults to TORCHSCRIPT_MODEL_PATH / ONNX_MODEL_PATH, "
+                                         "or classifier.onnx next to it with --quantization none)")
+    parser.add_argument("--quantization", choices=["static", "dynamic", "none"], default="static",
+                        help="int8 quantization for the ONNX export (default: static)")
+    parser.add_argument("--images", default=WARMUP_IMAGE_DIR,
+                        help="Images used to calibrate static quantization")
+    parser.add_argument("--eval-dir",
+                        help="Images for the accuracy and agreement check (default: every other image "
+                             "of --images, held out from calibration; all of --images with 'check')")
+    parser.add_argument("--min-agreement", type=float, default=1.0,
+                        help="Exit with an error if top-1 agreement is below this fraction")
+    args = parser.parse_args()
+
+    from transformers import AutoImageProcessor
+    transform = ImageTransform(AutoImageProcessor.from_pretrained(args.model))
+    image_size = (transform.crop_size if transform.do_center_crop else transform.resize_size) or (224, 224)
+    if args.command == "check":
+        # Nothing is calibrated, so nothing needs to be held out
+        calibration_paths, eval_paths = [], list_images(args.eval_dir or args.images)
+    else:
+        calibration_paths, eval_paths = split_images(list_images(args.images), args.eval_dir)
+
+    reference = model_backends.TorchBackend(args.model)
+    id2label = reference.model.config.id2label
+
+    if args.command == "torchscript":
+        output = args.output or TORCHSCRIPT_MODEL_PATH
+        model_backends.export_torchscript(reference.model, output, image_size)
+        print(f"Saved TorchScript model to {output}")
+        backend = model_backends.TorchScriptBackend(output)
+    elif args.command == "onnx":
+        output = args.output or ONNX_MODEL_PATH
+        if args.quantization == "none":
+            if not args.output:
+                # Don't write fp32 weights under the int8 file name
+                output = unquantized_path(ONNX_MODEL_PATH)
+            model_backends.export_onnx(reference.model, output, image_size)
+        else:
+            float_path = os.path.splitext(output)[0] + ".fp32.onnx"
+            model_backends.export_onnx(reference.model, float_path, image_size)
+            if args.quantization == "static" and not calibration_paths:
+                print(f"No calibration images left in {args.images}")
+                sys.exit(1)
+            print(f"Calibrating on {len(calibration_paths)} images from {args.images}")
+            calibration = [preprocess([path], transform).numpy() for path in calibration_paths]
+            model_backends.quantize_onnx(float_path, output, args.quantization, calibration)
+            os.remove(float_path)
+        print(f"Saved ONNX model ({args.quantization} quantization) to {output}")
+        if os.path.abspath(output) != os.path.abspath(ONNX_MODEL_PATH):
+            print(f"Set ONNX_MODEL_PATH={output} to serve it")
+        backend = model_backends.OnnxBackend(output)
+    else:
+        backend_name = args.backend or "onnx"
+        if backend_name == "torchscript":
+            backend = model_backends.TorchScriptBackend(args.output or TORCHSCRIPT_MODEL_PATH)
+        else:
+            backend = model_backends.OnnxBackend(args.output or ONNX_MODEL_PATH)
+
+    if not eval_paths:
+        print(f"No evaluation images found in {args.eval_dir or args.images}; skipping the agreement check")
+        return
+    source = args.eval_dir or args.images
+    if args.command == "check":
+        print(f"Evaluating on {len(eval_paths)} images from {source}")
+    else:
+        print(f"Evaluating on {len(eval_paths)} images from {source} (held out from calibration)")
+    agreement = check_agreement(backend, reference, eval_paths, transform, id2label)
+    if agreement < args.min_agreement:
+        print(f"Agreement below the required {args.min_agreement:.0%}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,383 @@
-# Load model directly
-from transformers import AutoImageProcessor, AutoModelForImageClassification
 import torch
-from PIL import Image
+import numpy as np
+from PIL import Image, ImageOps
 import os
 import io
+import re
+import threading
+from config import INFERENCE_BACKEND, CLASSIFIER_TOP_K
+from model_backends import load_backend
+
+MODEL_NAME = "linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification"
 
 # Initialize the model on-demand instead of at import time
 processor = None
-model = None
+# Inference backend (eager torch, TorchScript or ONNX Runtime, see model_backends)
+backend = None
+# Class index to label, from the model config
+id2label = None
+# Vectorized preprocessing built from the processor's settings
+transform = None
+# Intra-op thread budget of this worker, applied to torch and ONNX Runtime
+inference_threads = 0
+# Parsed plant/disease metadata for every label the model can emit
+label_table = None
+# Inference threads may call get_model() concurrently
+model_lock = threading.Lock()
 
 def get_model():
-    global processor, model
-    if processor is None or model is None:
-        from transformers import AutoImageProcessor, AutoModelForImageClassification
-        processor = AutoImageProcessor.from_pretrained("linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification")
-        model = AutoModelForImageClassification.from_pretrained("linkanjarad/mobilenet_v2_1.0_224-plant-disease-identification")
-    return processor, model
+    """Load the image processor and the configured inference backend once"""
+    global processor, backend, transform, id2label
+    if processor is None or backend is None:
+        with model_lock:
+            if processor is None or backend is None:
+                from transformers import AutoConfig, AutoImageProcessor
+                loaded_processor = AutoImageProcessor.from_pretrained(MODEL_NAME)
+                id2label = AutoConfig.from_pretrained(MODEL_NAME).id2label
+                transform = ImageTransform(loaded_processor)
+                processor = loaded_processor
+                # Exported backends don't need the Hugging Face model in memory at all
+                backend = load_backend(INFERENCE_BACKEND, MODEL_NAME, inference_threads)
+                build_label_table(id2label)
+    return processor, backend
 
-def analyze_plant_image(image_data):
+class ImageTransform:
     """
-    Analyze plant disease from image data
+    Batched replacement for calling the Hugging Face image processor.
+    
+    Resize, center crop, rescale and normalize parameters (size, crop_size,
+    resample, rescale_factor, image_mean, image_std) are read from the loaded
+    processor and applied in the same order and precision, so the pixel
+    values match the processor's output. The per-image work is limited to
+    one PIL resize and crop; rescaling and normalization run once on the
+    whole stacked batch.
+    """
+    def __init__(self, image_processor):
+        size = dict(getattr(image_processor, "size", None) or {})
+        crop_size = dict(getattr(image_processor, "crop_size", None) or {})
+        
+        self.do_resize = getattr(image_processor, "do_resize", True) and bool(size)
+        self.shortest_edge = size.get("shortest_edge")
+        self.resize_size = None if self.shortest_edge else (size.get("height"), size.get("width"))
+        self.resample = getattr(image_processor, "resample", Image.BILINEAR)
+        
+        self.do_center_crop = getattr(image_processor, "do_center_crop", False) and bool(crop_size)
+        self.crop_size = (crop_size.get("height"), crop_size.get("width"))
+        
+        self.rescale_factor = (image_processor.rescale_factor
+                               if getattr(image_processor, "do_rescale", False) else None)
+        if getattr(image_processor, "do_normalize", False):
+            self.mean = torch.tensor(image_processor.image_mean, dtype=torch.float32).view(1, -1, 1, 1)
+            self.std = torch.tensor(image_processor.image_std, dtype=torch.float32).view(1, -1, 1, 1)
+        else:
+            self.mean = self.std = None
+    
+    @property
+    def draft_size(self):
+        """
+        Smallest (width, height) the decoder may produce without losing
+        resolution the transform needs; used for JPEG draft-mode decoding
+        """
+        if self.do_resize and self.shortest_edge:
+            return (self.shortest_edge, self.shortest_edge)
+        if self.do_resize:
+            height, width = self.resize_size
+            return (width, height)
+        if self.do_center_crop:
+            height, width = self.crop_size
+            return (width, height)
+        return None
+    
+    def _resize_and_crop(self, image):
+        if self.do_resize:
+            if self.shortest_edge:
+                # Same output size rule as the processor: short side to
+                # shortest_edge, long side scaled and truncated
+                width, height = image.size
+                short, long = (width, height) if width <= height else (height, width)
+                new_short, new_long = self.shortest_edge, int(self.shortest_edge * long / short)
+                new_size = (new_short, new_long) if width <= height else (new_long, new_short)
+            else:
+                height, width = self.resize_size
+                new_size = (width, height)
+            image = image.resize(new_size, resample=self.resample, reducing_gap=None)
+        
+        if self.do_center_crop:
+            crop_height, crop_width = self.crop_size
+            width, height = image.size
+            top = (height - crop_height) // 2
+            left = (width - crop_width) // 2
+            image = image.crop((left, top, left + crop_width, top + crop_height))
+        return image
+    
+    def __call__(self, images):
+        """
+        Turn decoded RGB images into a model-ready batch
+        
+        Returns:
+            torch.Tensor: float32 pixel values of shape (batch, channels, height, width)
+        """
+        pixels = np.stack([np.asarray(self._resize_and_crop(image)) for image in images])
+        pixels = torch.from_numpy(pixels).permute(0, 3, 1, 2)
+        if self.rescale_factor is not None:
+            # The processor rescales in float64 and then casts to float32
+            pixels = (pixels.to(torch.float64) * self.rescale_factor).to(torch.float32)
+        else:
+            pixels = pixels.to(torch.float32)
+        if self.mean is not None:
+            pixels = (pixels - self.mean) / self.std
+        return pixels.contiguous()
+
+def _normalize_name(name):
+    """Turn label fragments like 'Bacterial_spot' into 'Bacterial Spot'"""
+    name = re.sub(r"\s+", " ", name.replace("_", " ")).strip(" ,")
+    words = name.split(" ")
+    return " ".join(
+        word if i > 0 and word.lower() in ("and", "or", "of") else word[:1].upper() + word[1:]
+        for i, word in enumerate(words)
+    )
+
+def _split_label(label):
+    """
+    Split a label with an explicit structure into (plant, disease, is_healthy).
+    Returns None when the label has no recognizable separator.
+    """
+    # PlantVillage style: "Tomato___Bacterial_spot", "Apple___healthy"
+    if "___" in label:
+        plant, disease = label.split("___", 1)
+        is_healthy = disease.strip("_ ").lower() == "healthy"
+        return _normalize_name(plant), "Healthy" if is_healthy else _normalize_name(disease), is_healthy
+    
+    # Descriptive style: "Healthy Tomato Plant", "Tomato with Bacterial Spot"
+    healthy = re.match(r"^healthy\s+(.+?)(\s+plant)?$", label.strip(), re.IGNORECASE)
+    if healthy:
+        return _normalize_name(healthy.group(1)), "Healthy", True
+    if " with " in label:
+        plant, disease = label.split(" with ", 1)
+        return _normalize_name(plant), _normalize_name(disease), False
+    return None
+
+def parse_label(label, known_plants=()):
+    """
+    Parse a classifier label into plant and disease names
     
     Args:
-        image_data: BytesIO object or path to image file
+        label: Raw label from model.config.id2label
+        known_plants: Plant names used to resolve unstructured labels
+            such as "Tomato Mosaic Virus" or "Cedar Apple Rust"
         
     Returns:
-        str: Raw predicted label from the model
+        dict: label, plant_name, disease_name and is_healthy
     """
-    # Load the model on-demand
-    processor, model = get_model()
+    parts = _split_label(label)
+    if parts is None:
+        name = _normalize_name(label)
+        plant, disease = "Unknown", name
+        # Prefer a known plant at the start of the label, then anywhere in it
+        for candidate in sorted(known_plants, key=len, reverse=True):
+            if name.lower().startswith(candidate.lower() + " "):
+                plant, disease = candidate, name[len(candidate):].strip()
+                break
+        else:
+            for candidate in sorted(known_plants, key=len, reverse=True):
+                if re.search(r"\b" + re.escape(candidate) + r"\b", name, re.IGNORECASE):
+                    plant = candidate
+                    break
+        parts = (plant, disease, disease.lower() == "healthy")
+    
+    plant, disease, is_healthy = parts
+    return {
+        "label": label,
+        "plant_name": plant,
+        "disease_name": disease,
+        "is_healthy": is_healthy
+    }
+
+def build_label_table(id2label):
+    """Build the label metadata table for every label the model can emit"""
+    global label_table
+    labels = list(id2label.values())
+    # Labels with an explicit structure define the plant vocabulary used
+    # to resolve the remaining free-form labels
+    known_plants = set()
+    for label in labels:
+        parts = _split_label(label)
+        if parts is not None:
+            known_plants.add(parts[0])
+    label_table = {label: parse_label(label, known_plants) for label in labels}
+    return label_table
+
+def get_label_table():
+    """Return the label metadata table, loading only the model config if needed"""
+    if label_table is None:
+        with model_lock:
+            if label_table is None:
+                from transformers import AutoConfig
+                build_label_table(AutoConfig.from_pretrained(MODEL_NAME).id2label)
+    return label_table
+
+def get_label_info(label):
+    """Look up plant/disease metadata for a classifier label"""
+    table = get_label_table()
+    if label in table:
+        return table[label]
+    known_plants = {info["plant_name"] for info in table.values() if info["plant_name"] != "Unknown"}
+    return parse_label(label, known_plants)
+
+def set_inference_threads(num_threads=0):
+    """
+    Bound this worker's intra-op thread count. Used as the pool initializer:
+    it can't fail, so a model that doesn't load yet can't break the pool.
+    """
+    global inference_threads
+    if num_threads:
+        inference_threads = num_threads
+        torch.set_num_threads(num_threads)
+
+def init_inference_worker(num_threads=0):
+    """
+    Prepare an inference worker: bound torch's intra-op thread count and
+    preload the model so the first request doesn't pay for from_pretrained
+    """
+    set_inference_threads(num_threads)
+    get_model()
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+def list_images(image_dir):
+    """Sorted paths of the images in a directory (empty if it doesn't exist)"""
+    if not os.path.isdir(image_dir):
+        return []
+    return sorted(
+        os.path.join(image_dir, name) for name in os.listdir(image_dir)
+        if name.lower().endswith(IMAGE_EXTENSIONS)
+    )
+
+def read_image_bytes(image) -> bytes:
+    """Image bytes for a path, bytes or file-like (e.g. a spooled upload)"""
+    if isinstance(image, (bytes, bytearray, memoryview)):
+        return bytes(image)
+    if hasattr(image, "read") and hasattr(image, "seek"):
+        image.seek(0)
+        return image.read()
+    with open(image, "rb") as f:
+        return f.read()
+
+def _open_image(image_data, draft_size=None):
+    """
+    Decode a file path, bytes or file-like object (BytesIO, spooled upload)
+    as an upright RGB PIL image
     
+    Args:
+        image_data: Image source
+        draft_size: Optional (width, height) the image will be downsized to
+            anyway; JPEGs are then decoded at a reduced scale (1/2, 1/4 or
+            1/8) that still covers it, instead of at full resolution
+    """
     # Check if image_data is a file path or bytes
     if isinstance(image_data, str) and os.path.exists(image_data):
         image = Image.open(image_data)
-    elif isinstance(image_data, bytes) or isinstance(image_data, io.BytesIO):
-        image = Image.open(io.BytesIO(image_data) if isinstance(image_data, bytes) else image_data)
+    elif isinstance(image_data, bytes):
+        image = Image.open(io.BytesIO(image_data))
+    elif hasattr(image_data, "read") and hasattr(image_data, "seek"):
+        image_data.seek(0)
+        image = Image.open(image_data)
     else:
         raise ValueError("Invalid image data format")
     
-    # Process the image with the model
-    inputs = processor(image, return_tensors="pt")
+    if draft_size and image.format == "JPEG":
+        # EXIF rotation by 90/270 degrees swaps the axes, so cover both orientations
+        side = max(draft_size)
+        image.draft("RGB", (side, side))
     
-    with torch.no_grad():
-        logits = model(**inputs).logits
+    # Camera photos are often stored sideways with an EXIF orientation tag
+    image = ImageOps.exif_transpose(image)
+    return image.convert("RGB")
+
+def top_k_predictions(logits, k=CLASSIFIER_TOP_K):
+    """
+    Turn a batch of logits into the k most likely labels per image
+
+    Returns:
+        list: For each row, up to k (label, probability) pairs, most likely first
+    """
+    logits = np.asarray(logits, dtype=np.float64)
+    # Numerically stable softmax
+    probabilities = np.exp(logits - logits.max(-1, keepdims=True))
+    probabilities /= probabilities.sum(-1, keepdims=True)
+    # Stable sort keeps argmax's choice among ties in first place
+    top = np.argsort(-probabilities, axis=-1, kind="stable")[:, :max(1, k)]
+    return [
+        [(id2label[index], float(row_probabilities[index])) for index in row_top]
+        for row_top, row_probabilities in zip(top.tolist(), probabilities)
+    ]
+
+def predict_plant_images(images, top_k=CLASSIFIER_TOP_K, return_exceptions=False):
+    """
+    Classify a batch of plant images in a single forward pass
     
-    # Get the predicted label
-    predicted_label = logits.argmax(-1).item()
-    disease_full_name = model.config.id2label[predicted_label]
+    Args:
+        images: List of file-like objects, bytes or paths to image files
+        top_k: Number of most likely labels to return per image
+        return_exceptions: If True, images that cannot be decoded yield their
+            exception in the result list instead of failing the whole batch
+        
+    Returns:
+        list: For each image, in order, its top_k (label, probability) pairs
+            (most likely first) or its exception
+    """
+    # Load the model on-demand
+    get_model()
+    
+    results = [None] * len(images)
+    decoded = []
+    positions = []
+    for i, image_data in enumerate(images):
+        try:
+            decoded.append(_open_image(image_data, transform.draft_size))
+            positions.append(i)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results[i] = e
+    
+    if decoded:
+        # Preprocess the whole batch at once
+        pixel_values = transform(decoded)
+        logits = backend.predict(pixel_values)
+        
+        for i, prediction in zip(positions, top_k_predictions(logits, top_k)):
+            results[i] = prediction
     
+    return results
+
+def analyze_plant_images(images, return_exceptions=False):
+    """
+    Analyze a batch of plant images in a single forward pass
+    
+    Args:
+        images: List of file-like objects, bytes or paths to image files
+        return_exceptions: If True, images that cannot be decoded yield their
+            exception in the result list instead of failing the whole batch
+        
+    Returns:
+        list: Raw predicted label (or exception) for each image, in order
+    """
+    predictions = predict_plant_images(images, 1, return_exceptions)
+    return [prediction if isinstance(prediction, Exception) else prediction[0][0] for prediction in predictions]
+
+def analyze_plant_image(image_data):
+    """
+    Analyze plant disease from image data
+    
+    Args:
+        image_data: BytesIO object or path to image file
+        
+    Returns:
+        str: Raw predicted label from the model
+    """
     # Simply return the raw label without parsing
-    return disease_full_name
+    return analyze_plant_images([image_data])[0]
 
 # For testing locally
 if __name__ == "__main__":
@@ -4,23 +4,80 @@ import os
 project_root = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, project_root)
 
+import asyncio
+from contextlib import asynccontextmanager
+from typing import List
 from fastapi import FastAPI, HTTPException, File, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
-from schemas.request_models import DiseaseRequest, PlantingPlanRequest, WeatherForecastRequest
-from schemas.response_models import DiseaseResponse, PlantingPlanResponse, WeatherForecastResponse
+from schemas.request_models import DiseaseRequest, PlantingPlanRequest, WeatherForecastRequest, WeatherForecastBatchRequest
+from schemas.response_models import (DiseaseResponse, PlantingPlanResponse, WeatherForecastResponse,
+                                    DiseaseBatchItem, DiseaseBatchResponse,
+                                    WeatherForecastBatchItem, WeatherForecastBatchResponse)
 from agents.disease_agent import DiseaseAgent
 from agents.planting_agent import PlantingAgent
 from agents.weather_agent import WeatherAgent
 import uvicorn
 import traceback
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from services.translation_service import TranslationService
+from services.gemini_service import get_gemini_service
+from services.weather_service import WeatherService
+from services.inference_service import get_inference_service
+from utils.metrics import metrics
+from utils.sse import format_sse
+from utils.uploads import BodySizeLimitMiddleware, MULTIPART_OVERHEAD_BYTES, open_upload, UploadTooLargeError
+from config import DIAGNOSIS_CACHE_WARMUP, BATCH_MAX_ITEMS, UPLOAD_MAX_BYTES, BATCH_UPLOAD_MAX_BYTES
+
+# Shared clients, built once and reused by every agent
+gemini_service = get_gemini_service()
+weather_service = WeatherService()
+inference_service = get_inference_service()
+
+# Readiness of the warm resources, reported by /health/ready
+readiness = {
+    "clients": False,
+    "model": False
+}
+
+async def warmup_model():
+    """Preload the classifier and run warmup inferences in the background"""
+    try:
+        await inference_service.warmup()
+        readiness["model"] = True
+        print("Image classifier warmed up")
+    except Exception as e:
+        print(f"Model warmup failed: {str(e)}")
+        traceback.print_exc()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Build the shared clients before serving traffic
+    gemini_service.start()
+    await weather_service.start()
+    readiness["clients"] = True
+    
+    # Warm the model without blocking startup, so /health/live answers immediately
+    background_tasks = [asyncio.create_task(warmup_model())]
+    if DIAGNOSIS_CACHE_WARMUP:
+        # Precompute English and Bangla diagnoses for every classifier label
+        background_tasks.append(asyncio.create_task(disease_agent.warm_diagnosis_cache()))
+    try:
+        yield
+    finally:
+        readiness["clients"] = False
+        readiness["model"] = False
+        for task in background_tasks:
+            task.cancel()
+        await weather_service.close()
+        inference_service.close()
+        translation_service.translation_cache.close()
 
 app = FastAPI(
     title="Plant Care Assistant API",
     description="API for plant disease diagnosis, seasonal planting plans, and weather forecasts for agriculture",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
@@ -32,16 +89,26 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+# Reject oversized uploads before the multipart parser receives and spools them
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    limits={
+        "/disease/image": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES,
+        "/disease/image/stream": UPLOAD_MAX_BYTES + MULTIPART_OVERHEAD_BYTES,
+        "/disease/image/batch": BATCH_UPLOAD_MAX_BYTES
+    }
+)
+
 # Mount the static files directory
 app.mount("/static", StaticFiles(directory="static"), name="static")
 
-# Initialize agents
-disease_agent = DiseaseAgent()
-planting_agent = PlantingAgent()
-weather_agent = WeatherAgent()
-
 # Initialize translation service
-translation_service = TranslationService()
+translation_service = TranslationService(gemini_service)
+
+# Initialize agents
+disease_agent = DiseaseAgent(gemini_service, translation_service)
+planting_agent = PlantingAgent(gemini_service, weather_service)
+weather_agent = WeatherAgent(gemini_service, weather_service)
 
 @app.get("/")
 async def root():
@@ -67,11 +134,83 @@ async def root():
                 "path": "/weather/forecast",
                 "method": "POST",
                 "description": "Get weather forecasts with agricultural advice"
+            },
+            {
+                "path": "/disease/image/batch",
+                "method": "POST",
+                "description": "Diagnose plant diseases from several image uploads at once"
+            },
+            {
+                "path": "/weather/forecast/batch",
+                "method": "POST",
+                "description": "Get weather forecasts with agricultural advice for several locations"
             }
         ],
         "documentation": "Visit /docs for interactive API documentation"
     }
 
+def stream_with_translation(get_result, translate: bool) -> StreamingResponse:
+    """
+    Stream a response as Server-Sent Events: the English result is sent
+    immediately as a "result" event, then (if translate is set) each field's
+    Bangla translation as a "translation" event as soon as it is ready,
+    and finally a "done" event
+    """
+    async def events():
+        try:
+            result = await get_result()
+        except Exception as e:
+            traceback.print_exc()
+            yield format_sse("error", {"detail": str(e)})
+            return
+        
+        result_dict = result.dict()
+        yield format_sse("result", result_dict)
+        if translate:
+            try:
+                # Classifier labels are identifiers, not prose
+                translatable = {key: value for key, value in result_dict.items() if key != "top_predictions"}
+                async for path, value in translation_service.iter_translations(translatable):
+                    yield format_sse("translation", {"path": path, "value": value})
+            except Exception as e:
+                traceback.print_exc()
+                yield format_sse("error", {"detail": f"Translation error: {str(e)}"})
+        yield format_sse("done", {})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def check_batch_size(count: int):
+    """Reject empty batches and batches above BATCH_MAX_ITEMS"""
+    if count == 0:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if count > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"Batch too large: at most {BATCH_MAX_ITEMS} items per request")
+
+def read_image_upload(image: UploadFile):
+    """The uploaded image file with the per-image size limit applied, rejecting oversized uploads with 413"""
+    try:
+        return open_upload(image)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
+@app.get("/health/live")
+async def health_live():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def health_ready():
+    """Readiness probe: shared clients are built and the model is warmed up"""
+    ready = all(readiness.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "starting", "components": readiness}
+    )
+
 @app.post("/translate", description="Translate text to Bangla")
 async def translate_text(request: dict):
     """Translate text from English to Bangla"""
@@ -103,25 +242,26 @@ async def diagnose_disease(request: DiseaseRequest, translate: bool = False):
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error diagnosing disease: {str(e)}")
 
+@app.post("/disease/diagnose/stream")
+async def diagnose_disease_stream(request: DiseaseRequest, translate: bool = False):
+    """
+    Streaming variant of /disease/diagnose: sends the English diagnosis
+    immediately, then translated fields as Server-Sent Events
+    """
+    return stream_with_translation(lambda: disease_agent.diagnose(request), translate)
+
 @app.post("/disease/image", response_model=DiseaseResponse)
 async def diagnose_disease_from_image(image: UploadFile = File(...), translate: bool = False):
     """
     Diagnose plant diseases by uploading an image of the affected plant
     """
+    # Classify straight from the spooled upload instead of reading it whole
+    image_data = read_image_upload(image)
     try:
-        # Read the image data
-        image_data = await image.read()
-        
-        # Process the image through disease_agent
+        # Process the image through disease_agent; translated diagnoses are
+        # served from its label-keyed cache
         try:
-            result = await disease_agent.diagnose_from_image(image_data)
-            if translate:
-                # Create a dictionary representation and translate all fields
-                result_dict = result.dict()
-                translated_dict = await translation_service.translate_dict_to_bangla(result_dict)
-                # Convert back to DiseaseResponse
-                return DiseaseResponse(**translated_dict)
-            return result
+            return await disease_agent.diagnose_from_image(image_data, language="bn" if translate else "en")
         except Exception as e:
             print(f"Error in disease_agent.diagnose_from_image: {str(e)}")
             traceback.print_exc()
@@ -131,6 +271,55 @@ async def diagnose_disease_from_image(image: UploadFile = File(...), translate:
         print(f"Error processing image upload: {str(e)}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error processing image: {str(e)}")
+    finally:
+        image_data.close()
+
+@app.post("/disease/image/stream")
+async def diagnose_disease_from_image_stream(image: UploadFile = File(...), translate: bool = False):
+    """
+    Streaming variant of /disease/image: sends the English diagnosis
+    immediately, then translated fields as Server-Sent Events
+    """
+    # Read the upload before streaming starts; the upload is closed afterwards
+    image_data = read_image_upload(image)
+    
+    async def diagnose():
+        try:
+            return await disease_agent.diagnose_from_image(image_data)
+        finally:
+            image_data.close()
+    
+    return stream_with_translation(diagnose, translate)
+
+@app.post("/disease/image/batch", response_model=DiseaseBatchResponse)
+async def diagnose_disease_from_images(images: List[UploadFile] = File(...), translate: bool = False):
+    """
+    Diagnose plant diseases for several uploaded images at once. All images
+    are classified in one forward pass; each image gets its own result or error.
+    """
+    check_batch_size(len(images))
+    image_data = []
+    try:
+        for image in images:
+            image_data.append(read_image_upload(image))
+        results = await disease_agent.diagnose_images(image_data, language="bn" if translate else "en")
+    except HTTPException:
+        raise
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Disease analysis error: {str(e)}")
+    finally:
+        for buffer in image_data:
+            buffer.close()
+    
+    items = []
+    for image, result in zip(images, results):
+        if isinstance(result, Exception):
+            print(f"Error diagnosing {image.filename}: {str(result)}")
+            items.append(DiseaseBatchItem(filename=image.filename, error=str(result)))
+        else:
+            items.append(DiseaseBatchItem(filename=image.filename, result=result))
+    return DiseaseBatchResponse(results=items)
 
 @app.get("/disease/image")
 async def diagnose_disease_from_image_get():
@@ -160,6 +349,14 @@ async def create_planting_plan(request: PlantingPlanRequest, translate: bool = F
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error creating planting plan: {str(e)}")
 
+@app.post("/planting/plan/stream")
+async def create_planting_plan_stream(request: PlantingPlanRequest, translate: bool = False):
+    """
+    Streaming variant of /planting/plan: sends the English plan
+    immediately, then translated fields as Server-Sent Events
+    """
+    return stream_with_translation(lambda: planting_agent.create_planting_plan(request), translate)
+
 @app.get("/planting/plan")
 async def create_planting_plan_get():
     """Return helpful message when GET is used instead of POST"""
@@ -193,6 +390,88 @@ async def get_weather_forecast(request: WeatherForecastRequest, translate: bool
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error getting weather forecast: {str(e)}")
 
+@app.post("/weather/forecast/stream")
+async def get_weather_forecast_stream(request: WeatherForecastRequest, translate: bool = False):
+    """
+    Streaming variant of /weather/forecast, as Server-Sent Events: the
+    structured forecast is sent immediately as a "forecast" event, the
+    agricultural advice follows as "advice" events while Gemini generates it,
+    then the complete English response as a "result" event, translated
+    fields as "translation" events (if translate is set) and a "done" event
+    """
+    async def events():
+        try:
+            forecast, formatted_forecast = await weather_agent.get_forecast(request)
+        except Exception as e:
+            traceback.print_exc()
+            # Same placeholder as the non-streaming endpoint
+            yield format_sse("result", WeatherForecastResponse(
+                location=request.location,
+                forecasts=[],
+                planting_advice="Weather forecast unavailable. Please try again later."
+            ).dict())
+            yield format_sse("done", {})
+            return
+        
+        yield format_sse("forecast", forecast.dict())
+        
+        advice = []
+        try:
+            async for chunk in weather_agent.stream_interpretation(request.location, formatted_forecast):
+                advice.append(chunk)
+                yield format_sse("advice", {"text": chunk})
+        except Exception as e:
+            traceback.print_exc()
+            yield format_sse("error", {"detail": f"Error generating weather advice: {str(e)}"})
+            return
+        
+        forecast.planting_advice = "".join(advice)
+        result_dict = forecast.dict()
+        yield format_sse("result", result_dict)
+        if translate:
+            try:
+                async for path, value in translation_service.iter_translations(result_dict):
+                    yield format_sse("translation", {"path": path, "value": value})
+            except Exception as e:
+                traceback.print_exc()
+                yield format_sse("error", {"detail": f"Translation error: {str(e)}"})
+        yield format_sse("done", {})
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/weather/forecast/batch", response_model=WeatherForecastBatchResponse)
+async def get_weather_forecasts(request: WeatherForecastBatchRequest, translate: bool = False):
+    """
+    Get weather forecasts with agricultural interpretation for several
+    locations at once; each location gets its own result or error
+    """
+    check_batch_size(len(request.locations))
+    try:
+        results = await weather_agent.get_forecasts_with_interpretation(request.locations, request.days)
+        
+        if translate:
+            # Translate every successful result together so shared strings are sent once
+            succeeded = [i for i, result in enumerate(results) if not isinstance(result, Exception)]
+            translated = await translation_service.translate_dict_to_bangla([results[i].dict() for i in succeeded])
+            for i, translated_dict in zip(succeeded, translated):
+                results[i] = WeatherForecastResponse(**translated_dict)
+    except Exception as e:
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error getting weather forecasts: {str(e)}")
+    
+    items = []
+    for location, result in zip(request.locations, results):
+        if isinstance(result, Exception):
+            print(f"Error getting weather forecast for {location}: {str(result)}")
+            items.append(WeatherForecastBatchItem(location=location, error=str(result)))
+        else:
+            items.append(WeatherForecastBatchItem(location=location, result=result))
+    return WeatherForecastBatchResponse(results=items)
+
 @app.get("/weather/forecast")
 async def get_weather_forecast_get():
     """Return helpful message when GET is used instead of POST"""
@@ -201,11 +480,16 @@ async def get_weather_forecast_get():
         "message": "This endpoint requires a POST request with a JSON body",
         "example": {
             "location": "New York City",
-            "days": 7
+            "days": 5
         },
         "documentation_url": "/docs#/default/get_weather_forecast_weather_forecast_post"
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Expose internal performance metrics (batch sizes, queue waits, ...)"""
+    return metrics.snapshot()
+
 # Add a route to serve the index.html file
 @app.get("/app", response_class=FileResponse)
 async def serve_frontend():
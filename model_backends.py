@@ -0,0 +1,187 @@
+"""
+Interchangeable inference backends for the disease classifier.
+
+Every backend takes a preprocessed float32 batch of shape
+(batch, channels, height, width) and returns the logits as a NumPy array:
+
+- torch: the eager Hugging Face model, as loaded by from_pretrained
+- torchscript: a traced and frozen TorchScript export
+- onnx: an ONNX Runtime session, normally over an int8 quantized export
+
+Exports are produced with export_model.py.
+"""
+import inspect
+import os
+import numpy as np
+import torch
+from config import INFERENCE_BACKEND, TORCHSCRIPT_MODEL_PATH, ONNX_MODEL_PATH
+
+BACKENDS = ("torch", "torchscript", "onnx")
+
+class TorchBackend:
+    """Eager PyTorch inference with the Hugging Face model"""
+    name = "torch"
+
+    def __init__(self, model_name: str):
+        from transformers import AutoModelForImageClassification
+        self.model = AutoModelForImageClassification.from_pretrained(model_name)
+        self.model.eval()
+
+    def predict(self, pixel_values: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.model(pixel_values=pixel_values).logits.numpy()
+
+class TorchScriptBackend:
+    """Inference with a frozen TorchScript export (no Python-level module overhead)"""
+    name = "torchscript"
+
+    def __init__(self, path: str = TORCHSCRIPT_MODEL_PATH):
+        _require_export(path, "torchscript")
+        self.model = torch.jit.load(path, map_location="cpu")
+        self.model.eval()
+
+    def predict(self, pixel_values: torch.Tensor) -> np.ndarray:
+        with torch.no_grad():
+            return self.model(pixel_values).numpy()
+
+class OnnxBackend:
+    """Inference with ONNX Runtime on the CPU execution provider"""
+    name = "onnx"
+
+    def __init__(self, path: str = ONNX_MODEL_PATH, num_threads: int = 0):
+        _require_export(path, "onnx")
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            # Same per-worker thread budget as torch gets
+            options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def predict(self, pixel_values: torch.Tensor) -> np.ndarray:
+        return self.session.run(None, {self.input_name: pixel_values.numpy()})[0]
+
+def _require_export(path: str, backend: str):
+    if not os.path.exists(path):
+        raise FileNotFoundError(
+            f"No exported model at {path} for INFERENCE_BACKEND={backend}; "
+            f"create it with: python export_model.py {backend}"
+        )
+
+def load_backend(name: str = INFERENCE_BACKEND, model_name: str = None, num_threads: int = 0):
+    """
+    Build the configured inference backend
+
+    Args:
+        name: "torch", "torchscript" or "onnx"
+        model_name: Hugging Face model id or path, used by the torch backend
+        num_threads: Intra-op threads for ONNX Runtime (0 for its default)
+    """
+    if name == "torch":
+        return TorchBackend(model_name)
+    if name == "torchscript":
+        return TorchScriptBackend()
+    if name == "onnx":
+        return OnnxBackend(num_threads=num_threads)
+    raise ValueError(f"Unknown inference backend: {name} (expected one of {', '.join(BACKENDS)})")
+
+class LogitsModel(torch.nn.Module):
+    """Wraps a Hugging Face classifier so it takes and returns plain tensors, for export"""
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, pixel_values):
+        return self.model(pixel_values=pixel_values).logits
+
+def _example_input(image_size):
+    height, width = image_size
+    return torch.randn(1, 3, height, width)
+
+def export_torchscript(model, path: str, image_size=(224, 224)):
+    """Trace, freeze and save the model as TorchScript"""
+    wrapper = LogitsModel(model).eval()
+    with torch.no_grad():
+        traced = torch.jit.trace(wrapper, _example_input(image_size))
+        # Freezing inlines the weights as constants and folds batch norms
+        # into the preceding convolutions. (optimize_for_inference is left
+        # out: its prepacked ops don't survive save/load.)
+        frozen = torch.jit.freeze(traced)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    frozen.save(path)
+    return path
+
+def export_onnx(model, path: str, image_size=(224, 224), opset: int = 17):
+    """Export the model to ONNX (float32) with a dynamic batch dimension"""
+    wrapper = LogitsModel(model).eval()
+    export_kwargs = {}
+    if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+        # Newer torch releases default to the dynamo exporter; keep the tracing one
+        export_kwargs["dynamo"] = False
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with torch.no_grad():
+        torch.onnx.export(
+            wrapper,
+            (_example_input(image_size),),
+            path,
+            input_names=["pixel_values"],
+            output_names=["logits"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+            opset_version=opset,
+            **export_kwargs
+        )
+    return path
+
+def quantize_onnx(source_path: str, output_path: str, mode: str = "static", calibration_batches=()):
+    """
+    Quantize a float32 ONNX export to int8
+
+    Args:
+        source_path: float32 ONNX model
+        output_path: Where to write the int8 model
+        mode: "dynamic" (weights only, activations quantized at run time) or
+            "static" (activations calibrated ahead of time; usually faster
+            and more accurate for convolutional models)
+        calibration_batches: Preprocessed float32 batches used to calibrate
+            activation ranges in static mode
+    """
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_dynamic, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    # Shape inference and graph cleanup make more nodes quantizable
+    prepared_path = output_path + ".prep.onnx"
+    quant_pre_process(source_path, prepared_path, skip_symbolic_shape=True)
+    try:
+        if mode == "dynamic":
+            # ConvInteger kernels on CPU only take unsigned weights
+            quantize_dynamic(prepared_path, output_path, weight_type=QuantType.QUInt8)
+        elif mode == "static":
+            batches = [np.asarray(batch, dtype=np.float32) for batch in calibration_batches]
+            if not batches:
+                raise ValueError("Static quantization needs calibration images")
+
+            class ImageCalibrationReader(CalibrationDataReader):
+                def __init__(self):
+                    self.batches = iter(batches)
+
+                def get_next(self):
+                    batch = next(self.batches, None)
+                    return None if batch is None else {"pixel_values": batch}
+
+            quantize_static(
+                prepared_path, output_path, ImageCalibrationReader(),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True
+            )
+        else:
+            raise ValueError(f"Unknown quantization mode: {mode}")
+    finally:
+        if os.path.exists(prepared_path):
+            os.remove(prepared_path)
+    return output_path
@@ -14,4 +14,8 @@ class PlantingPlanRequest(BaseModel):
 
 class WeatherForecastRequest(BaseModel):
     location: str = Field(..., description="Location for weather forecast (city or coordinates)")
-    days: Optional[int] = Field(7, description="Number of days for the forecast")
+    days: Optional[int] = Field(5, description="Number of days for the forecast (up to 5; sliced from the full 5-day forecast)")
+
+class WeatherForecastBatchRequest(BaseModel):
+    locations: List[str] = Field(..., description="Locations for weather forecasts (cities or coordinates)")
+    days: Optional[int] = Field(5, description="Number of days for each forecast (up to 5)")
@@ -1,6 +1,10 @@
 from pydantic import BaseModel
 from typing import List, Optional
 
+class LabelPrediction(BaseModel):
+    label: str
+    probability: float
+
 class DiseaseResponse(BaseModel):
     plant_name: str
     possible_diseases: List[str]
@@ -8,6 +12,9 @@ class DiseaseResponse(BaseModel):
     preventive_measures: List[str]
     organic_solutions: Optional[List[str]] = None
     chemical_solutions: Optional[List[str]] = None
+    # Set for image diagnoses: classifier probability of the top label, and the top-k labels
+    confidence: Optional[float] = None
+    top_predictions: Optional[List[LabelPrediction]] = None
 
 class PlantingRecommendation(BaseModel):
     plant_name: str
@@ -32,3 +39,19 @@ class WeatherForecastResponse(BaseModel):
     location: str
     forecasts: List[WeatherForecast]
     planting_advice: str
+
+class DiseaseBatchItem(BaseModel):
+    filename: Optional[str] = None
+    result: Optional[DiseaseResponse] = None
+    error: Optional[str] = None
+
+class DiseaseBatchResponse(BaseModel):
+    results: List[DiseaseBatchItem]
+
+class WeatherForecastBatchItem(BaseModel):
+    location: str
+    result: Optional[WeatherForecastResponse] = None
+    error: Optional[str] = None
+
+class WeatherForecastBatchResponse(BaseModel):
+    results: List[WeatherForecastBatchItem]
@@ -0,0 +1,79 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+from config import DIAGNOSIS_CACHE_PATH, DIAGNOSIS_CACHE_MAX_ENTRIES, DIAGNOSIS_CACHE_TTL
+from utils.cache import TTLCache
+
+class DiagnosisCache:
+    """
+    Diagnoses per (label, language): an in-process LRU in front of a SQLite
+    store shared by every worker process on the host. Each write touches
+    only its own row, and all SQLite work runs off the event loop.
+    """
+    def __init__(self, path: str = DIAGNOSIS_CACHE_PATH, max_entries: int = DIAGNOSIS_CACHE_MAX_ENTRIES,
+                 ttl_seconds: float = DIAGNOSIS_CACHE_TTL):
+        self.max_entries = max(1, max_entries)
+        self.ttl_seconds = ttl_seconds
+        self.memory = TTLCache(self.max_entries, ttl_seconds)
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=10, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS diagnoses ("
+            "key TEXT PRIMARY KEY, value TEXT, created_at REAL, expires_at REAL)"
+        )
+        self.db.commit()
+
+    def _load(self, key: str) -> Optional[tuple]:
+        with self.lock:
+            return self.db.execute(
+                "SELECT value, expires_at FROM diagnoses WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())
+            ).fetchone()
+
+    def _store(self, key: str, value: str, now: float, expires_at: Optional[float]):
+        with self.lock:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO diagnoses (key, value, created_at, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, expires_at)
+                )
+                # Keep the table bounded: drop expired rows, then the oldest beyond max_entries
+                self.db.execute("DELETE FROM diagnoses WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+                self.db.execute(
+                    "DELETE FROM diagnoses WHERE key NOT IN "
+                    "(SELECT key FROM diagnoses ORDER BY created_at DESC LIMIT ?)",
+                    (self.max_entries,)
+                )
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is not None:
+            return value
+        row = await asyncio.get_running_loop().run_in_executor(None, self._load, key)
+        if row is None:
+            return None
+        value = json.loads(row[0])
+        # Keep the remaining lifetime, not a fresh one
+        remaining = max(row[1] - time.time(), 0.001) if row[1] is not None else None
+        self.memory.set(key, value, remaining)
+        return value
+
+    async def set(self, key: str, value: dict):
+        self.memory.set(key, value)
+        now = time.time()
+        expires_at = now + self.ttl_seconds if self.ttl_seconds else None
+        encoded = json.dumps(value, ensure_ascii=False)
+        await asyncio.get_running_loop().run_in_executor(None, self._store, key, encoded, now, expires_at)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -1,55 +1,308 @@
 import google.generativeai as genai
 import asyncio
+import heapq
+import itertools
 import time
-from typing import Dict, Any, Optional
-from config import GEMINI_API_KEY, GEMINI_MODEL, GEMINI_RATE_LIMIT
+from enum import IntEnum
+from typing import AsyncIterator, Dict, Any, Optional
+from pydantic import TypeAdapter, ValidationError
+from config import (GEMINI_API_KEY, GEMINI_MODEL, GEMINI_RATE_LIMIT, GEMINI_RATE_BURST,
+                    STRUCTURED_OUTPUT_MAX_REPAIRS)
+from utils.api_utils import RateLimiter
+from utils.prompt_templates import GenerationProfile, PromptProfiles, compact_json, compact_text
+from utils.metrics import metrics
+
+QUEUE_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+TOKEN_BUCKETS = (64, 128, 256, 512, 768, 1024, 2048, 4096, 8192)
+
+class Priority(IntEnum):
+    """Scheduling priority of a Gemini call; lower values are served first"""
+    USER_FACING = 0      # diagnoses, planting plans, weather advice
+    TRANSLATION = 1      # translation of responses
+    UI_TRANSLATION = 2   # translation of UI strings
+    BACKGROUND = 3       # cache warmup and other bulk jobs
+
+class PriorityScheduler:
+    """
+    Admits Gemini calls one at a time as the rate limit allows, always
+    picking the highest-priority waiting call (FIFO within a priority)
+    """
+    def __init__(self, enforce_rate_limit):
+        self.enforce_rate_limit = enforce_rate_limit
+        self.queue = []
+        self.sequence = itertools.count()
+        self.wakeup = None
+        self.dispatcher = None
+        self.queue_depth = {p: metrics.gauge(f"gemini_queue_depth.{p.name.lower()}") for p in Priority}
+        self.queue_wait = {p: metrics.histogram(f"gemini_queue_wait_seconds.{p.name.lower()}", QUEUE_WAIT_BUCKETS)
+                           for p in Priority}
+    
+    async def acquire(self, priority: Priority):
+        """Wait until this call is allowed to go out"""
+        loop = asyncio.get_running_loop()
+        if self.dispatcher is None or self.dispatcher.done():
+            self.wakeup = asyncio.Event()
+            self.dispatcher = loop.create_task(self._dispatch())
+        
+        future = loop.create_future()
+        heapq.heappush(self.queue, (priority, next(self.sequence), future, time.perf_counter()))
+        self.queue_depth[priority].inc()
+        self.wakeup.set()
+        await future
+    
+    async def _dispatch(self):
+        while True:
+            while not self.queue:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+            
+            # Wait for a slot in the global quota, then hand it to whoever
+            # has the highest priority at that moment
+            await self.enforce_rate_limit()
+            while self.queue:
+                priority, _, future, enqueued = heapq.heappop(self.queue)
+                self.queue_depth[priority].dec()
+                if future.done():
+                    # The caller was cancelled while waiting
+                    continue
+                self.queue_wait[priority].observe(time.perf_counter() - enqueued)
+                future.set_result(None)
+                break
+
+class StructuredOutputError(ValueError):
+    """Raised when Gemini output can't be parsed into the requested schema, even after repair"""
+
+def _strip_code_fence(text: str) -> str:
+    """Remove a markdown code fence around a JSON payload, if there is one"""
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+class StructuredOutputStats:
+    """Per-template counters for structured generation, exposed on /metrics"""
+    def __init__(self, template: str):
+        self.requests = metrics.counter(f"structured_output_requests.{template}")
+        self.parse_failures = metrics.counter(f"structured_output_parse_failures.{template}")
+        self.repairs = metrics.counter(f"structured_output_repairs.{template}")
+        self.failures = metrics.counter(f"structured_output_failures.{template}")
+        self.parse_failure_rate = metrics.gauge(f"structured_output_parse_failure_rate.{template}")
+        self.failure_rate = metrics.gauge(f"structured_output_failure_rate.{template}")
+    
+    def update_rates(self):
+        if self.requests.value:
+            self.parse_failure_rate.set(self.parse_failures.value / self.requests.value)
+            self.failure_rate.set(self.failures.value / self.requests.value)
 
 class GeminiService:
+    """
+    Gateway to the Gemini API. One instance is shared process-wide (see
+    get_gemini_service) so all agents draw from a single client and quota.
+    """
     def __init__(self):
-        genai.configure(api_key=GEMINI_API_KEY)
-        self.model = genai.GenerativeModel(GEMINI_MODEL)
-        self.request_times = []
-        self.lock = asyncio.Lock()
+        self.model = None
+        # One client per distinct system instruction, which the SDK binds to the model
+        self.models = {}
+        self.rate_limiter = RateLimiter(GEMINI_RATE_LIMIT, key="gemini", burst=GEMINI_RATE_BURST)
+        self.scheduler = PriorityScheduler(self._enforce_rate_limit)
+        self.structured_stats = {}
+    
+    def start(self):
+        """Configure the SDK and build the Gemini client"""
+        if self.model is None:
+            genai.configure(api_key=GEMINI_API_KEY)
+            self.model = genai.GenerativeModel(GEMINI_MODEL)
+    
+    def _get_model(self, system_instruction: Optional[str]):
+        """The client for a system instruction, passed natively rather than prepended to the prompt"""
+        if not system_instruction:
+            return self.model
+        model = self.models.get(system_instruction)
+        if model is None:
+            model = self.models[system_instruction] = genai.GenerativeModel(
+                GEMINI_MODEL, system_instruction=system_instruction
+            )
+        return model
     
     async def _enforce_rate_limit(self):
         """Enforce rate limiting for the Gemini API"""
-        async with self.lock:
-            current_time = time.time()
-            # Remove timestamps older than a minute
-            self.request_times = [t for t in self.request_times if current_time - t < 60]
-            
-            if len(self.request_times) >= GEMINI_RATE_LIMIT:
-                oldest_request = self.request_times[0]
-                sleep_time = 60 - (current_time - oldest_request)
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-            
-            self.request_times.append(time.time())
+        await self.rate_limiter.acquire()
+    
+    def _generation_config(self, profile: GenerationProfile, json_mode: bool = False) -> Dict[str, Any]:
+        generation_config = profile.generation_config()
+        if json_mode:
+            # Constrain decoding to syntactically valid JSON
+            generation_config["response_mime_type"] = "application/json"
+        return generation_config
+    
+    def _record_usage(self, profile: GenerationProfile, response):
+        """Record token counts and truncations per template"""
+        usage = getattr(response, "usage_metadata", None)
+        if usage is not None:
+            metrics.histogram(f"gemini_input_tokens.{profile.name}", TOKEN_BUCKETS).observe(
+                usage.prompt_token_count)
+            metrics.histogram(f"gemini_output_tokens.{profile.name}", TOKEN_BUCKETS).observe(
+                usage.candidates_token_count)
+        candidates = getattr(response, "candidates", None)
+        if candidates and getattr(candidates[0].finish_reason, "name", None) == "MAX_TOKENS":
+            # The budget was too tight for this answer
+            metrics.counter(f"gemini_truncated_responses.{profile.name}").inc()
     
-    async def generate_content(self, prompt: str, system_instruction: Optional[str] = None) -> str:
-        """Generate content from Gemini API with rate limiting"""
-        await self._enforce_rate_limit()
+    async def generate_content(self, prompt: str, system_instruction: Optional[str] = None,
+                               priority: Priority = Priority.USER_FACING,
+                               profile: GenerationProfile = PromptProfiles.DEFAULT) -> str:
+        """Generate content from Gemini API with rate limiting and priority scheduling"""
+        return await self._generate(prompt, system_instruction, priority, profile, json_mode=False)
+    
+    async def _generate(self, prompt: str, system_instruction: Optional[str], priority: Priority,
+                        profile: GenerationProfile, json_mode: bool) -> str:
+        await self.scheduler.acquire(priority)
+        self.start()
         
-        generation_config = {
-            "temperature": 0.7,
-            "top_p": 0.95,
-            "top_k": 40,
-            "max_output_tokens": 1024,
-        }
+        generation_config = self._generation_config(profile, json_mode)
+        if system_instruction:
+            system_instruction = compact_text(system_instruction)
         
         try:
-            if system_instruction:
-                response = await self.model.generate_content_async(
-                    system_instruction + "\n\n" + prompt,
-                    generation_config=generation_config
-                )
-            else:
-                response = await self.model.generate_content_async(
-                    prompt, 
-                    generation_config=generation_config
-                )
-            
+            response = await self._get_model(system_instruction).generate_content_async(
+                compact_text(prompt),
+                generation_config=generation_config
+            )
+            self._record_usage(profile, response)
             return response.text
         except Exception as e:
             print(f"Error calling Gemini API: {str(e)}")
             raise e
+    
+    def _structured_stats(self, template: str) -> StructuredOutputStats:
+        stats = self.structured_stats.get(template)
+        if stats is None:
+            stats = self.structured_stats[template] = StructuredOutputStats(template)
+        return stats
+    
+    async def generate_structured(self, prompt: str, schema: Any, profile: GenerationProfile,
+                                  system_instruction: Optional[str] = None,
+                                  priority: Priority = Priority.USER_FACING,
+                                  max_repairs: int = STRUCTURED_OUTPUT_MAX_REPAIRS) -> Any:
+        """
+        Generate JSON output and parse it straight into a schema
+        
+        The call runs in JSON mode and the reply is parsed and validated in a
+        single pass. If it doesn't validate, Gemini is asked to repair its own
+        output, at most max_repairs times.
+        
+        Args:
+            prompt: The prompt
+            schema: A pydantic model or type annotation (e.g. Dict[str, str])
+            profile: Generation profile of the template; statistics are reported under its name
+            system_instruction: Optional system instruction
+            priority: Scheduling priority of the call (and of any repairs)
+            max_repairs: Maximum number of repair calls
+        
+        Returns:
+            The validated value, e.g. a model instance
+        
+        Raises:
+            StructuredOutputError: If the output still doesn't validate after repairs.
+            API errors are raised as-is.
+        """
+        adapter = TypeAdapter(schema)
+        template = profile.name
+        stats = self._structured_stats(template)
+        stats.requests.inc()
+        
+        text = await self._generate(prompt, system_instruction, priority, profile, json_mode=True)
+        attempt = 0
+        while True:
+            try:
+                result = self._parse_structured(text, adapter)
+                stats.update_rates()
+                return result
+            except ValidationError as e:
+                error = e
+            
+            if attempt == 0:
+                stats.parse_failures.inc()
+            if attempt >= max_repairs:
+                break
+            attempt += 1
+            stats.repairs.inc()
+            text = await self._generate(self._repair_prompt(text, error, adapter), None, priority, profile, json_mode=True)
+        
+        stats.failures.inc()
+        stats.update_rates()
+        print(f"Structured output for {template} failed to parse: {str(error)}")
+        raise StructuredOutputError(f"Could not parse {template} output: {str(error)}")
+    
+    def _parse_structured(self, text: str, adapter: TypeAdapter) -> Any:
+        try:
+            return adapter.validate_json(text)
+        except ValidationError:
+            # JSON mode shouldn't produce a fenced block, but it costs nothing to check
+            stripped = _strip_code_fence(text)
+            if stripped == text.strip():
+                raise
+            return adapter.validate_json(stripped)
+    
+    def _repair_prompt(self, text: str, error: ValidationError, adapter: TypeAdapter) -> str:
+        return f"""
+        The following output was supposed to be JSON matching this JSON schema, but it is not valid.
+        
+        Schema:
+        {compact_json(adapter.json_schema())}
+        
+        Output:
+        {text}
+        
+        Validation errors:
+        {str(error)}
+        
+        Return only the corrected JSON, keeping the original content wherever possible.
+        """
+    
+    async def generate_content_stream(self, prompt: str, system_instruction: Optional[str] = None,
+                                      priority: Priority = Priority.USER_FACING,
+                                      profile: GenerationProfile = PromptProfiles.DEFAULT) -> AsyncIterator[str]:
+        """
+        Stream generated text from Gemini API chunk by chunk as it is produced.
+        The call counts once against the rate limit, like generate_content.
+        
+        Yields:
+            str: Text chunks in generation order
+        """
+        await self.scheduler.acquire(priority)
+        self.start()
+        
+        if system_instruction:
+            system_instruction = compact_text(system_instruction)
+        
+        try:
+            response = await self._get_model(system_instruction).generate_content_async(
+                compact_text(prompt),
+                generation_config=self._generation_config(profile),
+                stream=True
+            )
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. a final safety or finish-reason chunk)
+                    continue
+                if text:
+                    yield text
+            # Usage metadata is complete once the stream is exhausted
+            self._record_usage(profile, response)
+        except Exception as e:
+            print(f"Error streaming from Gemini API: {str(e)}")
+            raise e
+
+# Shared instance so every agent goes through one client and one quota
+gemini_service = None
+
+def get_gemini_service() -> GeminiService:
+    global gemini_service
+    if gemini_service is None:
+        gemini_service = GeminiService()
+    return gemini_service
@@ -0,0 +1,132 @@
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+from config import GEOCODE_CACHE_PATH, GEOCODE_GRID_DEGREES, GEOCODE_MEMORY_ENTRIES, GEOCODE_NOT_FOUND_TTL
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
+
+# "23.81, 90.41" style coordinates
+COORDINATE_PATTERN = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+# Generic words that don't change which place is meant
+GENERIC_SUFFIXES = (" city", " town", " district", " division")
+# Memoized result for queries the geocoding API has no match for
+NOT_FOUND = ()
+
+def normalize_location(location: str) -> str:
+    """Normalize free-text locations so trivial variants share cache entries"""
+    location = re.sub(r"\s+", " ", location).strip(" .,;").lower()
+    location = re.sub(r"\s*,\s*", ",", location)
+    for suffix in GENERIC_SUFFIXES:
+        head, _, tail = location.partition(",")
+        if head.endswith(suffix) and len(head) > len(suffix):
+            location = head[:-len(suffix)] + ("," + tail if tail else "")
+    return location
+
+class GeocodingService:
+    """
+    Resolves free-text locations to coordinates once, memoizes the result in
+    memory and in SQLite (read and written off the event loop), and snaps
+    coordinates to a grid cell so that every spelling of a place (and nearby
+    places) shares one forecast cache key
+    """
+    def __init__(self, fetch_json: Callable[[str, Dict[str, Any]], Awaitable[Any]], api_key: Optional[str],
+                 path: str = GEOCODE_CACHE_PATH, grid_degrees: float = GEOCODE_GRID_DEGREES):
+        self.fetch_json = fetch_json
+        self.api_key = api_key
+        self.base_url = "https://api.openweathermap.org/geo/1.0"
+        self.grid_degrees = grid_degrees
+        # Bounded, since queries are arbitrary user text; unknown locations
+        # are remembered briefly so repeats don't spend geocoding calls
+        self.memory = TTLCache(GEOCODE_MEMORY_ENTRIES)
+        self.flights = SingleFlight()
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS geocodes ("
+            "query TEXT PRIMARY KEY, lat REAL, lon REAL, name TEXT, country TEXT, created_at REAL)"
+        )
+        self.db.commit()
+        self.cache_hits = metrics.counter("geocode_cache_hits")
+        self.cache_misses = metrics.counter("geocode_cache_misses")
+
+    def grid_cell(self, lat: float, lon: float, name: str = "") -> Dict[str, Any]:
+        """Snap coordinates to the center of their grid cell"""
+        step = self.grid_degrees
+        decimals = max(0, -int(math.floor(math.log10(step)))) if step < 1 else 0
+        cell_lat = round(round(lat / step) * step, decimals)
+        cell_lon = round(round(lon / step) * step, decimals)
+        return {
+            "key": f"{cell_lat:.{decimals}f},{cell_lon:.{decimals}f}",
+            "lat": cell_lat,
+            "lon": cell_lon,
+            "name": name
+        }
+
+    async def resolve(self, location: str) -> Dict[str, Any]:
+        """
+        Resolve a location to its grid cell
+        
+        Returns:
+            dict: key (shared cache key), lat, lon and resolved place name
+        """
+        coordinates = COORDINATE_PATTERN.match(location)
+        if coordinates:
+            return self.grid_cell(float(coordinates.group(1)), float(coordinates.group(2)), location.strip())
+        
+        query = normalize_location(location)
+        if not query:
+            raise ValueError("Location is empty")
+        
+        resolved = self.memory.get(query)
+        if resolved is None:
+            resolved = await asyncio.get_running_loop().run_in_executor(None, self._load, query)
+            if resolved is not None:
+                self.memory.set(query, resolved)
+        if resolved is not None:
+            self.cache_hits.inc()
+            if resolved == NOT_FOUND:
+                raise ValueError(f"Location not found: {query}")
+            return self.grid_cell(*resolved)
+        
+        self.cache_misses.inc()
+        resolved = await self.flights.do(query, lambda: self._geocode(query))
+        return self.grid_cell(*resolved)
+
+    def _load(self, query: str):
+        with self.lock:
+            row = self.db.execute("SELECT lat, lon, name FROM geocodes WHERE query = ?", (query,)).fetchone()
+        return tuple(row) if row else None
+
+    async def _geocode(self, query: str):
+        """Look the location up with the OpenWeatherMap geocoding API and remember it"""
+        results = await self.fetch_json(f"{self.base_url}/direct", {"q": query, "limit": 1, "appid": self.api_key})
+        if not results:
+            self.memory.set(query, NOT_FOUND, GEOCODE_NOT_FOUND_TTL)
+            raise ValueError(f"Location not found: {query}")
+        
+        place = results[0]
+        resolved = (place["lat"], place["lon"], place.get("name", query))
+        self.memory.set(query, resolved)
+        await asyncio.get_running_loop().run_in_executor(None, self._store, query, resolved, place.get("country"))
+        return resolved
+
+    def _store(self, query: str, resolved, country: Optional[str]):
+        with self.lock:
+            with self.db:
+                self.db.execute(
+                    "INSERT OR REPLACE INTO geocodes (query, lat, lon, name, country, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (query, resolved[0], resolved[1], resolved[2], country, time.time())
+                )
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -0,0 +1,273 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from typing import Any, Awaitable, Callable, List, Tuple
+import image2disease
+from image2disease import read_image_bytes
+from services.worker_pool import ForkWorkerPool
+from config import (INFERENCE_MAX_BATCH_SIZE, INFERENCE_MAX_WAIT_MS, INFERENCE_EXECUTOR,
+                    INFERENCE_WORKERS, INFERENCE_TORCH_THREADS, WARMUP_IMAGE_DIR, WARMUP_ROUNDS,
+                    CLASSIFIER_TOP_K)
+from utils.metrics import metrics
+
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+QUEUE_WAIT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+class InferenceExecutor:
+    """
+    Dedicated pool that runs CPU-bound classification off the event loop.
+    Uses either threads sharing one model with a bounded torch thread count,
+    processes that each load their own copy of the model, or forked
+    processes sharing the parent's model copy-on-write (see ForkWorkerPool).
+    """
+    def __init__(self, mode: str = INFERENCE_EXECUTOR, workers: int = INFERENCE_WORKERS,
+                 torch_threads: int = INFERENCE_TORCH_THREADS):
+        if mode not in ("thread", "process", "fork"):
+            raise ValueError(f"Unknown inference executor mode: {mode}")
+        self.mode = mode
+        self.workers = max(1, workers)
+        # Split the available cores between workers unless told otherwise
+        self.torch_threads = torch_threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self.pool = None
+
+    def _create_pool(self):
+        # The initializers only set the thread count. The model is loaded by
+        # the first task instead, so a failed load (e.g. the hub being
+        # unreachable) fails that request and is retried by the next one,
+        # rather than leaving a broken pool behind.
+        if self.mode == "process":
+            # Spawn rather than fork: forking after torch has started its
+            # thread pools can deadlock the children
+            return ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=image2disease.set_inference_threads,
+                initargs=(self.torch_threads,)
+            )
+        # torch's thread count is process-wide, so set it once for all threads
+        return ThreadPoolExecutor(
+            max_workers=self.workers,
+            thread_name_prefix="inference",
+            initializer=image2disease.set_inference_threads,
+            initargs=(self.torch_threads,)
+        )
+
+    async def _ensure_pool(self):
+        if self.pool is None:
+            if self.mode == "fork":
+                pool = ForkWorkerPool(self.workers, self.torch_threads)
+                await pool.start()
+                if self.pool is None:
+                    self.pool = pool
+                else:
+                    # Another caller started the pool first
+                    pool.shutdown()
+            else:
+                self.pool = self._create_pool()
+        return self.pool
+    
+    async def run(self, fn: Callable, *args):
+        """Run fn(*args) on the pool and await its result"""
+        pool = await self._ensure_pool()
+        if self.mode == "fork":
+            return await pool.call(fn, *args)
+        return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+    
+    async def classify(self, images: List[Any]) -> List[Any]:
+        """Classify a batch of images, returning top-k (label, probability) pairs or an exception per image"""
+        if self.mode == "fork":
+            # Image bytes travel through shared memory, not the pipe
+            pool = await self._ensure_pool()
+            return await pool.call(image2disease.predict_plant_images, CLASSIFIER_TOP_K, True, images=images)
+        if self.mode == "process":
+            # Open file objects can't be sent to another process
+            images = [read_image_bytes(image) for image in images]
+        return await self.run(image2disease.predict_plant_images, images, CLASSIFIER_TOP_K, True)
+
+    def shutdown(self):
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
+
+class MicroBatcher:
+    """
+    Collects concurrent inference requests into a queue and runs them as
+    batched forward passes. A batch is dispatched once it reaches
+    max_batch_size items or the oldest item has waited max_wait_ms.
+    Up to max_concurrent_batches batches may be in flight at once.
+    """
+    def __init__(self, infer_batch: Callable[[List[Any]], Awaitable[List[Any]]],
+                 max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+                 max_wait_ms: float = INFERENCE_MAX_WAIT_MS,
+                 max_concurrent_batches: int = 1):
+        self.infer_batch = infer_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self.max_concurrent_batches = max(1, max_concurrent_batches)
+        self.slots = None
+        self.pending = deque()
+        self.arrival = None
+        self.worker = None
+        self.batch_size_histogram = metrics.histogram("inference_batch_size", BATCH_SIZE_BUCKETS)
+        self.queue_wait_histogram = metrics.histogram("inference_queue_wait_seconds", QUEUE_WAIT_BUCKETS)
+
+    def _ensure_worker(self):
+        """Start the batching loop on the running event loop if needed"""
+        if self.worker is None or self.worker.done():
+            self.arrival = asyncio.Event()
+            self.slots = asyncio.Semaphore(self.max_concurrent_batches)
+            self.worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        """Queue a single item and wait for its own result"""
+        self._ensure_worker()
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append((item, future, time.perf_counter()))
+        self.arrival.set()
+        return await future
+
+    async def _next_batch(self):
+        """Wait for the first item, then fill the batch until it is full or the deadline passes"""
+        while not self.pending:
+            self.arrival.clear()
+            await self.arrival.wait()
+
+        batch = [self.pending.popleft()]
+        deadline = time.perf_counter() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            if self.pending:
+                batch.append(self.pending.popleft())
+                continue
+            timeout = deadline - time.perf_counter()
+            if timeout <= 0:
+                break
+            self.arrival.clear()
+            try:
+                await asyncio.wait_for(self.arrival.wait(), timeout)
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Only start collecting a batch once a worker is free to run it,
+            # so requests keep accumulating while all workers are busy
+            await self.slots.acquire()
+            batch = await self._next_batch()
+            task = loop.create_task(self._process(batch))
+            task.add_done_callback(lambda _: self.slots.release())
+
+    async def _process(self, batch):
+        """Run one forward pass and hand each caller its own result"""
+        # Drop requests whose callers have gone away
+        batch = [entry for entry in batch if not entry[1].done()]
+        if not batch:
+            return
+
+        started = time.perf_counter()
+        self.batch_size_histogram.observe(len(batch))
+        for _, _, enqueued in batch:
+            self.queue_wait_histogram.observe(started - enqueued)
+
+        try:
+            results = await self.infer_batch([item for item, _, _ in batch])
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+class InferenceService:
+    """Awaitable entry point for image classification requests"""
+    def __init__(self):
+        self.executor = InferenceExecutor()
+        self.batcher = MicroBatcher(self._classify_batch,
+                                    max_concurrent_batches=self.executor.workers)
+
+    async def _classify_batch(self, images):
+        return await self.executor.classify(images)
+
+    async def classify(self, image_data) -> List[Tuple[str, float]]:
+        """
+        Classify a single image, batched together with concurrent requests
+        
+        Returns:
+            list: The top-k (label, probability) pairs, most likely first
+        """
+        return await self.batcher.submit(image_data)
+
+    async def classify_many(self, images: List[Any]) -> List[Any]:
+        """
+        Classify a group of images in a single forward pass, bypassing the
+        micro-batcher since the batch is already formed
+        
+        Returns:
+            list: Top-k (label, probability) pairs per image, or the
+                exception raised for that image
+        """
+        if not images:
+            return []
+        self.batcher.batch_size_histogram.observe(len(images))
+        return await self._classify_batch(list(images))
+    
+    async def get_label_table(self) -> dict:
+        """The label metadata table, loaded off the event loop if needed"""
+        if image2disease.label_table is None:
+            await asyncio.get_running_loop().run_in_executor(None, image2disease.get_label_table)
+        return image2disease.label_table
+
+    async def get_label_info(self, label: str) -> dict:
+        """Plant/disease metadata for a classifier label"""
+        await self.get_label_table()
+        return image2disease.get_label_info(label)
+
+    async def warmup(self, image_dir: str = WARMUP_IMAGE_DIR, rounds: int = WARMUP_ROUNDS):
+        """
+        Load the model in every worker and run a few inferences on the bundled
+        test images so the first real request doesn't pay for model loading or
+        first-inference allocator warmup
+        """
+        image_paths = image2disease.list_images(image_dir)
+        
+        # Hit every worker at once so each one loads its model, and make sure
+        # the label table is available in this process
+        await asyncio.get_running_loop().run_in_executor(None, image2disease.get_label_table)
+        await asyncio.gather(*[
+            self.executor.run(image2disease.init_inference_worker, self.executor.torch_threads)
+            for _ in range(self.executor.workers)
+        ])
+        if not image_paths:
+            print(f"No warmup images found in {image_dir}; skipping warmup inferences")
+            return
+        
+        for _ in range(max(0, rounds)):
+            # Warm both the single-image and the full-batch code paths
+            await asyncio.gather(*[
+                self.executor.run(image2disease.analyze_plant_images, [path]) for path in image_paths
+            ])
+            await self.executor.run(image2disease.analyze_plant_images, image_paths)
+
+    def close(self):
+        """Release the inference worker pool"""
+        self.executor.shutdown()
+
+# Shared instance so every caller feeds the same batch queue
+inference_service = None
+
+def get_inference_service() -> InferenceService:
+    global inference_service
+    if inference_service is None:
+        inference_service = InferenceService()
+    return inference_service
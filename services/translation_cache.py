@@ -0,0 +1,150 @@
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+from config import GEMINI_MODEL, TRANSLATION_CACHE_PATH, TRANSLATION_CACHE_MEMORY_ENTRIES
+from utils.cache import TTLCache
+from utils.metrics import metrics
+
+# A line optionally starting with a list marker ("- ", "* ", "• ", "1. ", "2) ")
+LINE_PATTERN = re.compile(r"^(\s*(?:[-*•]|\d+[.)])\s+)?(.*?)(\s*)$", re.DOTALL)
+# Sentence boundary: end punctuation followed by whitespace and a new sentence
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])(\s+)(?=[A-Z0-9\"'(])")
+
+def normalize_text(text: str) -> str:
+    """Normalize text for cache lookups"""
+    return re.sub(r"\s+", " ", text).strip()
+
+def split_segments(text: str) -> List[Tuple[bool, str]]:
+    """
+    Split text into sentence and list-item segments
+    
+    Returns:
+        list: (is_segment, text) pairs. Segments are translated independently;
+            the other parts (line breaks, list markers, spacing) are kept
+            verbatim so the original formatting can be reassembled.
+    """
+    parts = []
+    lines = text.split("\n")
+    for i, line in enumerate(lines):
+        if i > 0:
+            parts.append((False, "\n"))
+        marker, body, trailing = LINE_PATTERN.match(line).groups()
+        if marker:
+            parts.append((False, marker))
+        if body:
+            pieces = SENTENCE_BOUNDARY.split(body)
+            # split() with a capture group alternates sentence, whitespace, sentence...
+            for j, piece in enumerate(pieces):
+                if piece:
+                    parts.append((j % 2 == 0, piece))
+        if trailing:
+            parts.append((False, trailing))
+    return parts
+
+class TranslationCache:
+    """
+    Two-level translation memory: an in-process LRU in front of a SQLite
+    store, keyed by normalized source text and model. SQLite is only read
+    and written off the event loop.
+    """
+    def __init__(self, path: str = TRANSLATION_CACHE_PATH,
+                 memory_entries: int = TRANSLATION_CACHE_MEMORY_ENTRIES,
+                 model: str = GEMINI_MODEL):
+        self.model = model
+        self.memory = TTLCache(memory_entries)
+        self.lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        # WAL with NORMAL sync makes a commit an append without an fsync; a
+        # crash can lose the last few translations, which are just re-requested
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "key TEXT PRIMARY KEY, model TEXT, source TEXT, translation TEXT, created_at REAL)"
+        )
+        self.db.commit()
+        self.memory_hits = metrics.counter("translation_cache_memory_hits")
+        self.disk_hits = metrics.counter("translation_cache_disk_hits")
+        self.misses = metrics.counter("translation_cache_misses")
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.model}\0{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+    def _load(self, keys: List[str]) -> Dict[str, str]:
+        found = {}
+        with self.lock:
+            # Stay well below SQLite's limit on bound parameters
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                found.update(self.db.execute(
+                    f"SELECT key, translation FROM translations WHERE key IN ({','.join('?' * len(chunk))})", chunk
+                ).fetchall())
+        return found
+
+    def _store(self, rows: List[tuple]):
+        with self.lock:
+            with self.db:
+                self.db.executemany(
+                    "INSERT OR REPLACE INTO translations (key, model, source, translation, created_at) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+
+    async def get(self, text: str) -> Optional[str]:
+        return (await self.get_many([text])).get(text)
+
+    async def get_many(self, texts: List[str]) -> Dict[str, str]:
+        """
+        Cached translations of several texts, as a dict with only the texts
+        found. The memory LRU is checked on the event loop; the rest are read
+        from SQLite in one query off it.
+        """
+        translations = {}
+        missing = {}
+        for text in texts:
+            key = self._key(text)
+            translation = self.memory.get(key)
+            if translation is not None:
+                self.memory_hits.inc()
+                translations[text] = translation
+            else:
+                missing.setdefault(key, []).append(text)
+        if not missing:
+            return translations
+
+        found = await asyncio.get_running_loop().run_in_executor(None, self._load, list(missing))
+        for key, missing_texts in missing.items():
+            translation = found.get(key)
+            if translation is None:
+                self.misses.inc(len(missing_texts))
+                continue
+            self.disk_hits.inc(len(missing_texts))
+            self.memory.set(key, translation)
+            for text in missing_texts:
+                translations[text] = translation
+        return translations
+
+    async def set(self, text: str, translation: str):
+        await self.set_many([(text, translation)])
+
+    async def set_many(self, items: Iterable[Tuple[str, str]]):
+        """Store several (text, translation) pairs in one transaction, off the event loop"""
+        now = time.time()
+        rows = []
+        for text, translation in items:
+            key = self._key(text)
+            self.memory.set(key, translation)
+            rows.append((key, self.model, normalize_text(text), translation, now))
+        if rows:
+            await asyncio.get_running_loop().run_in_executor(None, self._store, rows)
+
+    def close(self):
+        with self.lock:
+            self.db.close()
@@ -1,11 +1,16 @@
 import asyncio
-from config import GEMINI_MODEL
-from services.gemini_service import GeminiService
-import json
+from config import (GEMINI_MODEL, TRANSLATION_BATCH_MAX_ITEMS, TRANSLATION_BATCH_MAX_CHARS,
+                    TRANSLATION_STREAM_CONCURRENCY)
+from services.gemini_service import GeminiService, Priority, get_gemini_service
+from services.translation_cache import TranslationCache, split_segments
+from utils.prompt_templates import PromptProfiles, compact_json
+from typing import Any, Dict
 
 class TranslationService:
-    def __init__(self):
-        self.gemini_service = GeminiService()
+    def __init__(self, gemini_service: GeminiService = None, translation_cache: TranslationCache = None):
+        self.gemini_service = gemini_service or get_gemini_service()
+        # Segment-level translation memory shared across requests and restarts
+        self.translation_cache = translation_cache or TranslationCache()
         
         # Common UI elements translation cache
         self.ui_translations = {
@@ -13,10 +18,17 @@ class TranslationService:
             "bangla": {}
         }
     
+    def _should_translate(self, text):
+        """Skip translation for empty or very short texts and numbers"""
+        return bool(text) and len(text) >= 3 and not text.replace('.', '').isdigit()
+    
     async def translate_to_bangla(self, text):
         """
         Translate text from English to Bangla using Gemini
         
+        The text is split into sentence and list-item segments; segments found
+        in the translation cache are reused and only new ones go to Gemini.
+        
         Args:
             text: Text to translate (string)
             
@@ -27,9 +39,126 @@ class TranslationService:
             return ""
         
         # Skip translation for very short texts or numbers
-        if len(text) < 3 or (text.replace('.', '').isdigit()):
+        if not self._should_translate(text):
             return text
+        
+        parts = split_segments(text)
+        segments = list(dict.fromkeys(
+            part for is_segment, part in parts if is_segment and self._should_translate(part)
+        ))
+        
+        translations = await self.translation_cache.get_many(segments)
+        missing = [segment for segment in segments if segment not in translations]
+        
+        translations.update(await self._translate_segments(missing))
+        
+        return "".join(translations.get(part, part) if is_segment else part for is_segment, part in parts)
+    
+    async def translate_texts(self, texts):
+        """
+        Translate many strings at once, sending all uncached segments to
+        Gemini in a few batched calls instead of one call per string
+        
+        Args:
+            texts: List of English strings
             
+        Returns:
+            list: Bangla translations in the same order
+        """
+        split_texts = [split_segments(text) if self._should_translate(text) else None for text in texts]
+        
+        segments = list(dict.fromkeys(
+            part for parts in split_texts for is_segment, part in parts or []
+            if is_segment and self._should_translate(part)
+        ))
+        translations = await self.translation_cache.get_many(segments)
+        missing = [segment for segment in segments if segment not in translations]
+        
+        translations.update(await self._translate_segments(missing))
+        
+        return [
+            text if parts is None else
+            "".join(translations.get(part, part) if is_segment else part for is_segment, part in parts)
+            for text, parts in zip(texts, split_texts)
+        ]
+    
+    async def _translate_segments(self, segments):
+        """Translate uncached segments, batching them when there is more than one"""
+        if not segments:
+            return {}
+        if len(segments) == 1:
+            return {segments[0]: await self._translate_segment(segments[0])}
+        
+        # Split into size-capped batches and translate them concurrently
+        batches = []
+        current, current_chars = [], 0
+        for segment in segments:
+            if current and (len(current) >= TRANSLATION_BATCH_MAX_ITEMS or
+                            current_chars + len(segment) > TRANSLATION_BATCH_MAX_CHARS):
+                batches.append(current)
+                current, current_chars = [], 0
+            current.append(segment)
+            current_chars += len(segment)
+        batches.append(current)
+        
+        translations = {}
+        for result in await asyncio.gather(*[self._translate_batch(batch) for batch in batches]):
+            translations.update(result)
+        return translations
+    
+    async def _translate_batch(self, segments):
+        """
+        Translate a batch of segments in one keyed-JSON Gemini call. Keys that
+        come back missing or malformed fall back to per-segment translation.
+        """
+        keyed = {f"s{i}": segment for i, segment in enumerate(segments)}
+        
+        prompt = f"""
+        Translate every English value in this JSON object to Bangla (Bengali).
+        The texts might be related to plants, agriculture, diseases, or weather.
+        Keep the keys unchanged and translate each value independently.
+        
+        ```json
+        {compact_json(keyed)}
+        ```
+        
+        Return only a JSON object with exactly the same keys and the translated values.
+        """
+        
+        system_instruction = """
+        আপনি একজন পেশাদার অনুবাদক যিনি কৃষি, উদ্ভিদ, রোগ এবং আবহাওয়া সম্পর্কিত পরিভাষা সম্পর্কে বিশেষজ্ঞ।
+        JSON অবজেক্টের প্রতিটি মান সঠিকভাবে ইংরেজি থেকে বাংলায় অনুবাদ করুন, কী পরিবর্তন করবেন না।
+        শুধুমাত্র একটি বৈধ JSON অবজেক্ট ফেরত দিন, কোন ব্যাখ্যা বা অতিরিক্ত নোট নয়।
+        """
+        
+        translated = {}
+        try:
+            # Values are checked key by key below, so any JSON object is accepted here
+            translated = await self.gemini_service.generate_structured(
+                prompt, Dict[str, Any], PromptProfiles.BATCH_TRANSLATION, system_instruction, Priority.TRANSLATION
+            )
+        except Exception as e:
+            print(f"Batch translation error: {str(e)}")
+        
+        translations = {}
+        fallback = []
+        for key, segment in keyed.items():
+            value = translated.get(key)
+            if isinstance(value, str) and value.strip():
+                translations[segment] = value.strip()
+            else:
+                fallback.append(segment)
+        # One transaction for the whole batch
+        await self.translation_cache.set_many(translations.items())
+        
+        # Only the affected keys are retried one by one
+        if fallback:
+            results = await asyncio.gather(*[self._translate_segment(segment) for segment in fallback])
+            translations.update(zip(fallback, results))
+        return translations
+    
+    async def _translate_segment(self, text):
+        """Translate a single segment with Gemini and remember the result"""
         prompt = f"""
         Translate the following English text to Bangla (Bengali).
         The text might be related to plants, agriculture, diseases, or weather:
@@ -50,25 +179,38 @@ class TranslationService:
         """
         
         try:
-            result = await self.gemini_service.generate_content(prompt, system_instruction)
+            result = await self.gemini_service.generate_content(
+                prompt, system_instruction, Priority.TRANSLATION, PromptProfiles.TRANSLATION
+            )
             # Clean up any markdown formatting that might be returned
             result = result.replace("```", "").strip()
-            return result
+            if result:
+                await self.translation_cache.set(text, result)
+                return result
+            return text
         except Exception as e:
             print(f"Translation error: {str(e)}")
             # Return original text if translation fails
             return text
     
-    async def translate_dict_to_bangla(self, data):
+    async def translate_dict_to_bangla(self, data, batched=True):
         """
         Recursively translate all string values in a dictionary/list from English to Bangla
         
         Args:
             data: Dictionary or list containing strings to translate
+            batched: Collect every string and translate them together in a few
+                batched calls, instead of one call per string
             
         Returns:
             dict/list: With all string values translated to Bangla
         """
+        if batched:
+            texts = []
+            self._collect_strings(data, texts)
+            translations = await self.translate_texts(texts)
+            return self._replace_strings(data, iter(translations))
+        
         if isinstance(data, str):
             # Enhanced debugging to track translation issues
             print(f"Translating string: {data[:50]}...")
@@ -79,18 +221,80 @@ class TranslationService:
             # Translate each item in the list separately for better control
             results = []
             for item in data:
-                results.append(await self.translate_dict_to_bangla(item))
+                results.append(await self.translate_dict_to_bangla(item, batched=False))
             return results
         elif isinstance(data, dict):
             # Process dictionaries - translate each value separately
             result = {}
             for key, value in data.items():
-                result[key] = await self.translate_dict_to_bangla(value)
+                result[key] = await self.translate_dict_to_bangla(value, batched=False)
             return result
         else:
             # Return non-string/dict/list values as is
             return data
     
+    async def iter_translations(self, data, concurrency=TRANSLATION_STREAM_CONCURRENCY):
+        """
+        Translate every string field concurrently and yield each one as soon
+        as it is done, for progressive (streamed) responses
+        
+        Args:
+            data: Dictionary or list containing strings to translate
+            concurrency: Maximum number of translations in flight
+            
+        Yields:
+            tuple: (path, translated_text) where path is the list of keys and
+                indices leading to the field
+        """
+        fields = []
+        self._collect_paths(data, [], fields)
+        semaphore = asyncio.Semaphore(max(1, concurrency))
+        
+        async def translate_field(path, text):
+            async with semaphore:
+                return path, await self.translate_to_bangla(text)
+        
+        tasks = [asyncio.ensure_future(translate_field(path, text)) for path, text in fields]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            # The client may disconnect mid-stream
+            for task in tasks:
+                task.cancel()
+    
+    def _collect_paths(self, data, path, fields):
+        """Collect (path, text) for every string leaf"""
+        if isinstance(data, str):
+            fields.append((path, data))
+        elif isinstance(data, list):
+            for i, item in enumerate(data):
+                self._collect_paths(item, path + [i], fields)
+        elif isinstance(data, dict):
+            for key, value in data.items():
+                self._collect_paths(value, path + [key], fields)
+    
+    def _collect_strings(self, data, texts):
+        """Collect every string leaf in traversal order"""
+        if isinstance(data, str):
+            texts.append(data)
+        elif isinstance(data, list):
+            for item in data:
+                self._collect_strings(item, texts)
+        elif isinstance(data, dict):
+            for value in data.values():
+                self._collect_strings(value, texts)
+    
+    def _replace_strings(self, data, translations):
+        """Rebuild the structure, taking string leaves from translations in traversal order"""
+        if isinstance(data, str):
+            return next(translations)
+        elif isinstance(data, list):
+            return [self._replace_strings(item, translations) for item in data]
+        elif isinstance(data, dict):
+            return {key: self._replace_strings(value, translations) for key, value in data.items()}
+        return data
+    
     async def get_ui_translations(self):
         """
         Get translations for common UI elements
@@ -145,6 +349,7 @@ class TranslationService:
             "Preventive Measures": "Preventive Measures",
             "Organic Solutions": "Organic Solutions",
             "Chemical Solutions": "Chemical Solutions",
+            "Confidence": "Confidence",
             "Planting Time": "Planting Time",
             "Growing Conditions": "Growing Conditions",
             "Care Instructions": "Care Instructions",
@@ -164,7 +369,7 @@ class TranslationService:
         self.ui_translations["english"] = ui_elements
         
         # Prepare a JSON of all elements for batch translation
-        ui_json = json.dumps(ui_elements, ensure_ascii=False)
+        ui_json = compact_json(ui_elements)
         
         # Translate the entire JSON at once to maintain consistency
         prompt = f"""
@@ -184,17 +389,9 @@ class TranslationService:
         """
         
         try:
-            result = await self.gemini_service.generate_content(prompt, system_instruction)
-            
-            # Extract JSON from the response
-            if "```json" in result:
-                json_str = result.split("```json")[1].split("```")[0].strip()
-            elif "```" in result:
-                json_str = result.split("```")[1].strip()
-            else:
-                json_str = result
-                
-            translated_elements = json.loads(json_str)
+            translated_elements = await self.gemini_service.generate_structured(
+                prompt, Dict[str, str], PromptProfiles.UI_TRANSLATION, system_instruction, Priority.UI_TRANSLATION
+            )
             self.ui_translations["bangla"] = translated_elements
             
         except Exception as e:
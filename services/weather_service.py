@@ -1,44 +1,144 @@
 import httpx
 import asyncio
+import importlib.util
 import time
-from typing import Dict, Any
-from config import WEATHER_API_KEY, WEATHER_RATE_LIMIT
+from typing import Dict, Any, Optional
+from config import (WEATHER_API_KEY, WEATHER_RATE_LIMIT, WEATHER_RATE_BURST, WEATHER_HTTP_MAX_CONNECTIONS,
+                    WEATHER_HTTP_MAX_KEEPALIVE, WEATHER_HTTP_KEEPALIVE_EXPIRY, WEATHER_HTTP_TIMEOUT,
+                    WEATHER_HTTP_CONNECT_TIMEOUT, WEATHER_HTTP2, WEATHER_CACHE_TTL, WEATHER_CACHE_STALE_TTL,
+                    WEATHER_CACHE_MAX_ENTRIES)
+from utils.api_utils import RateLimiter
+from utils.cache import TTLCache
+from utils.metrics import metrics
+from utils.singleflight import SingleFlight
+from services.geocoding_service import GeocodingService
+from utils.forecast_engine import slice_forecast
 
 class WeatherService:
     def __init__(self):
         self.base_url = "https://api.openweathermap.org/data/2.5"
         self.api_key = WEATHER_API_KEY
-        self.request_times = []
-        self.lock = asyncio.Lock()
+        self.rate_limiter = RateLimiter(WEATHER_RATE_LIMIT, key="openweathermap", burst=WEATHER_RATE_BURST)
+        self.client: Optional[httpx.AsyncClient] = None
+        
+        # Free-text locations are resolved once to a shared grid cell key
+        self.geocoder = GeocodingService(self._get_json, self.api_key)
+        
+        # Forecasts only change every few hours: cache them per grid cell, keep
+        # serving them for a while after they go stale while a refresh runs,
+        # and coalesce concurrent fetches for the same location
+        self.forecast_cache = TTLCache(WEATHER_CACHE_MAX_ENTRIES, WEATHER_CACHE_TTL + WEATHER_CACHE_STALE_TTL)
+        self.forecast_flights = SingleFlight()
+        self.refresh_tasks = set()
+        self.cache_hits = metrics.counter("weather_cache_hits")
+        self.cache_stale_hits = metrics.counter("weather_cache_stale_hits")
+        self.cache_misses = metrics.counter("weather_cache_misses")
+    
+    async def start(self):
+        """Create the pooled, keep-alive HTTP client reused across forecast requests"""
+        if self.client is not None:
+            return
+        
+        http2 = WEATHER_HTTP2
+        if http2 and importlib.util.find_spec("h2") is None:
+            print("WEATHER_HTTP2 is enabled but the 'h2' package is not installed; falling back to HTTP/1.1")
+            http2 = False
+        
+        self.client = httpx.AsyncClient(
+            http2=http2,
+            limits=httpx.Limits(
+                max_connections=WEATHER_HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=WEATHER_HTTP_MAX_KEEPALIVE,
+                keepalive_expiry=WEATHER_HTTP_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(WEATHER_HTTP_TIMEOUT, connect=WEATHER_HTTP_CONNECT_TIMEOUT)
+        )
+    
+    async def close(self):
+        """Close the shared HTTP client and the geocoding store"""
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+        self.geocoder.close()
     
     async def _enforce_rate_limit(self):
         """Enforce rate limiting for the weather API"""
-        async with self.lock:
-            current_time = time.time()
-            # Remove timestamps older than a minute
-            self.request_times = [t for t in self.request_times if current_time - t < 60]
-            
-            if len(self.request_times) >= WEATHER_RATE_LIMIT:
-                oldest_request = self.request_times[0]
-                sleep_time = 60 - (current_time - oldest_request)
-                if sleep_time > 0:
-                    await asyncio.sleep(sleep_time)
-            
-            self.request_times.append(time.time())
-    
-    async def get_weather_forecast(self, location: str, days: int = 7) -> Dict[str, Any]:
-        """Get weather forecast for a location"""
+        await self.rate_limiter.acquire()
+    
+    async def _get_json(self, url: str, params: Dict[str, Any]) -> Any:
+        """Rate-limited GET over the pooled client"""
         await self._enforce_rate_limit()
+        # Normally started with the app; start lazily for scripts and tests
+        await self.start()
+        
+        response = await self.client.get(url, params=params)
+        response.raise_for_status()
+        
+        return response.json()
+    
+    async def resolve_location(self, location: str) -> Dict[str, Any]:
+        """Resolve a free-text location to its grid cell (key, lat, lon, name)"""
+        return await self.geocoder.resolve(location)
+    
+    async def get_weather_forecast(self, location: str, days: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Get weather forecast for a location
+        
+        The full 5-day horizon is fetched once per location and cached; the
+        requested number of days is a local slice of it, so requests for
+        different horizons share one upstream call.
+        
+        Args:
+            location: Free-text location or "lat,lon"
+            days: Number of local calendar days to return (None for all)
+        """
+        return slice_forecast(await self._get_full_forecast(location), days)
+    
+    async def _get_full_forecast(self, location: str) -> Dict[str, Any]:
+        """Full-horizon forecast for a location, served from the forecast store when possible"""
+        cell = await self.resolve_location(location)
+        key = cell["key"]
+        cached = self.forecast_cache.get(key)
+        if cached is not None:
+            fetched_at, data = cached
+            if time.time() - fetched_at < WEATHER_CACHE_TTL:
+                self.cache_hits.inc()
+                return data
+            # Stale but still within the grace period: answer now, refresh in the background
+            self.cache_stale_hits.inc()
+            self._refresh_in_background(key, cell)
+            return data
+        
+        self.cache_misses.inc()
+        return await self.forecast_flights.do(key, lambda: self._fetch_forecast(key, cell))
+    
+    def _refresh_in_background(self, key, cell: Dict[str, Any]):
+        """Start a single background refresh for a stale cache entry"""
+        if key in self.forecast_flights.in_flight:
+            return
+        task = asyncio.ensure_future(
+            self.forecast_flights.do(key, lambda: self._fetch_forecast(key, cell))
+        )
+        # Keep a reference so the task isn't garbage collected mid-flight
+        self.refresh_tasks.add(task)
+        task.add_done_callback(self._refresh_done)
+    
+    def _refresh_done(self, task):
+        self.refresh_tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Background forecast refresh failed: {str(task.exception())}")
+    
+    async def _fetch_forecast(self, key, cell: Dict[str, Any]) -> Dict[str, Any]:
+        """Fetch the full forecast for a grid cell from OpenWeatherMap and store it in the cache"""
+        # No "cnt": it counts 3-hour slots, not days. Without it we always get
+        # the full 5-day / 40-slot horizon and slice locally.
+        params = {
+            "lat": cell["lat"],
+            "lon": cell["lon"],
+            "appid": self.api_key,
+            "units": "metric"
+        }
         
-        async with httpx.AsyncClient() as client:
-            params = {
-                "q": location,
-                "appid": self.api_key,
-                "units": "metric",
-                "cnt": min(days, 7)  # OpenWeatherMap free tier limits to 7 days
-            }
-            
-            response = await client.get(f"{self.base_url}/forecast", params=params)
-            response.raise_for_status()
-            
-            return response.json()
+        data = await self._get_json(f"{self.base_url}/forecast", params)
+        self.forecast_cache.set(key, (time.time(), data))
+        return data
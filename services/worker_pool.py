@@ -0,0 +1,204 @@
+import asyncio
+import gc
+import itertools
+import multiprocessing
+import pickle
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Callable, List, Optional
+import image2disease
+from image2disease import read_image_bytes
+from config import INFERENCE_BACKEND
+from utils.metrics import metrics
+
+def _worker_main(conn, num_threads: int):
+    """
+    Inference worker loop. Runs in a forked child that already holds the
+    parent's model, so only the thread count is set here.
+    """
+    image2disease.set_inference_threads(num_threads)
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if message is None:
+            break
+
+        job_id, fn, args, shm_name, layout = message
+        try:
+            if shm_name is not None:
+                # Images arrive as one shared-memory block plus (start, end) offsets
+                shm = shared_memory.SharedMemory(name=shm_name)
+                try:
+                    images = [shm.buf[start:end].tobytes() for start, end in layout]
+                finally:
+                    shm.close()
+                args = (images,) + tuple(args)
+            reply = (job_id, True, fn(*args))
+        except Exception as e:
+            reply = (job_id, False, e)
+
+        try:
+            conn.send(reply)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Some exceptions can't be pickled; send their message instead
+            conn.send((job_id, False, RuntimeError(str(reply[2]))))
+    conn.close()
+
+class _Worker:
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        # (future, shared memory block) of the job in flight, if any
+        self.job = None
+
+class ForkWorkerPool:
+    """
+    Pool of forked inference workers sharing one copy of the model.
+
+    The parent loads the model once and freezes the garbage collector's view
+    of it, then forks the workers, so the weights are shared copy-on-write
+    instead of loaded once per worker. Each worker pins its own torch thread
+    count. Jobs go to an idle worker over a pipe that carries only small
+    control messages; image bytes are passed in a shared-memory block.
+    """
+    def __init__(self, workers: int, torch_threads: int):
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise ValueError("The fork inference executor needs a platform with fork() (Linux)")
+        self.size = max(1, workers)
+        self.torch_threads = torch_threads
+        self.context = multiprocessing.get_context("fork")
+        self.workers = []
+        self.idle = None
+        self.loop = None
+        self.job_ids = itertools.count()
+        self.restarts = metrics.counter("inference_worker_restarts")
+
+    async def start(self):
+        """Load the model in the parent, then fork the workers"""
+        self.loop = asyncio.get_running_loop()
+        self.idle = asyncio.Queue()
+        if INFERENCE_BACKEND == "onnx":
+            # ONNX Runtime sessions aren't fork-safe, so each worker builds its
+            # own session; only the label table is shared
+            await self.loop.run_in_executor(None, image2disease.get_label_table)
+        else:
+            await self.loop.run_in_executor(None, image2disease.get_model)
+        # Move everything allocated so far out of the collector's reach, so
+        # collections in the children don't write to (and copy) shared pages
+        gc.freeze()
+        # Start the shared-memory resource tracker before forking so every
+        # worker reports to the parent's tracker instead of starting its own
+        resource_tracker.ensure_running()
+        for _ in range(self.size):
+            self._spawn()
+
+    def _spawn(self):
+        parent_conn, child_conn = self.context.Pipe()
+        process = self.context.Process(
+            target=_worker_main, args=(child_conn, self.torch_threads),
+            name="inference-worker", daemon=True
+        )
+        process.start()
+        child_conn.close()
+        worker = _Worker(process, parent_conn)
+        self.workers.append(worker)
+        self.loop.add_reader(parent_conn.fileno(), self._on_readable, worker)
+        self.idle.put_nowait(worker)
+
+    async def call(self, fn: Callable, *args, images: Optional[List[Any]] = None):
+        """
+        Run fn(*args) on an idle worker, or fn(images, *args) when images are
+        given; the images are sent through shared memory
+        """
+        worker = await self.idle.get()
+        while worker not in self.workers:
+            # Exited while idle; its replacement is already queued
+            worker = await self.idle.get()
+        shm = None
+        try:
+            shm_name = layout = None
+            if images is not None:
+                shm, layout = self._pack(images)
+                shm_name = shm.name
+            future = self.loop.create_future()
+            worker.job = (future, shm)
+            worker.conn.send((next(self.job_ids), fn, args, shm_name, layout))
+        except BaseException:
+            # The job never reached the worker
+            worker.job = None
+            self._release(shm)
+            if worker.process.is_alive():
+                self.idle.put_nowait(worker)
+            raise
+        # The worker goes back to the idle queue when it replies, even if
+        # this caller is cancelled in the meantime
+        return await future
+
+    def _pack(self, images: List[Any]):
+        """Copy the encoded images into one shared-memory block"""
+        blobs = [read_image_bytes(image) for image in images]
+        shm = shared_memory.SharedMemory(create=True, size=max(1, sum(len(blob) for blob in blobs)))
+        layout = []
+        offset = 0
+        for blob in blobs:
+            shm.buf[offset:offset + len(blob)] = blob
+            layout.append((offset, offset + len(blob)))
+            offset += len(blob)
+        return shm, layout
+
+    def _release(self, shm):
+        if shm is not None:
+            shm.close()
+            shm.unlink()
+
+    def _on_readable(self, worker: _Worker):
+        try:
+            job_id, ok, result = worker.conn.recv()
+        except (EOFError, OSError):
+            self._on_worker_exit(worker)
+            return
+
+        future, shm = worker.job
+        worker.job = None
+        self._release(shm)
+        if not future.done():
+            if ok:
+                future.set_result(result)
+            else:
+                future.set_exception(result)
+        self.idle.put_nowait(worker)
+
+    def _on_worker_exit(self, worker: _Worker):
+        """Fail the job of a crashed worker and fork a replacement"""
+        self.loop.remove_reader(worker.conn.fileno())
+        worker.conn.close()
+        worker.process.join(timeout=1)
+        self.workers.remove(worker)
+        if worker.job is not None:
+            future, shm = worker.job
+            self._release(shm)
+            if not future.done():
+                future.set_exception(RuntimeError(
+                    f"Inference worker exited unexpectedly (exit code {worker.process.exitcode})"
+                ))
+        print(f"Inference worker {worker.process.pid} exited; starting a replacement")
+        self.restarts.inc()
+        self._spawn()
+
+    def shutdown(self, wait: bool = True):
+        """Stop all workers"""
+        for worker in self.workers:
+            self.loop.remove_reader(worker.conn.fileno())
+            try:
+                worker.conn.send(None)
+            except OSError:
+                pass
+        for worker in self.workers:
+            worker.process.join(timeout=5 if wait else 0.5)
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.conn.close()
+            if worker.job is not None:
+                self._release(worker.job[1])
+        self.workers = []
@@ -0,0 +1,44 @@
+import asyncio
+import os
+from services.diagnosis_cache import DiagnosisCache
+
+DIAGNOSIS = {"plant_name": "Tomato", "possible_diseases": ["Early blight"], "recommendations": ["Remove infected leaves"]}
+
+def test_entries_are_shared_between_processes(tmp_path):
+    path = os.path.join(tmp_path, "diagnoses.sqlite3")
+    # Two caches on one file stand in for two uvicorn workers
+    first, second = DiagnosisCache(path, 8, 3600), DiagnosisCache(path, 8, 3600)
+
+    async def run():
+        await first.set("Tomato___Early_blight|en", DIAGNOSIS)
+        await second.set("Tomato___healthy|en", dict(DIAGNOSIS, possible_diseases=[]))
+        return (await second.get("Tomato___Early_blight|en"), await first.get("Tomato___healthy|en"),
+                await first.get("Tomato___Late_blight|en"))
+
+    try:
+        shared, other, missing = asyncio.run(run())
+    finally:
+        first.close()
+        second.close()
+    assert shared == DIAGNOSIS
+    assert other["possible_diseases"] == []
+    assert missing is None
+
+def test_expired_and_excess_entries_are_dropped(tmp_path):
+    path = os.path.join(tmp_path, "diagnoses.sqlite3")
+    cache = DiagnosisCache(path, 2, 3600)
+
+    async def run():
+        for label in ("A", "B", "C"):
+            await cache.set(f"{label}|en", DIAGNOSIS)
+        # A fresh instance has an empty memory LRU, so this reads from SQLite
+        reopened = DiagnosisCache(path, 2, 3600)
+        try:
+            return [await reopened.get(f"{label}|en") for label in ("A", "B", "C")]
+        finally:
+            reopened.close()
+
+    try:
+        assert asyncio.run(run()) == [None, DIAGNOSIS, DIAGNOSIS]
+    finally:
+        cache.close()
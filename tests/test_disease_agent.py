@@ -0,0 +1,30 @@
+import asyncio
+import os
+import pytest
+import agents.disease_agent as disease_agent_module
+from agents.disease_agent import DiseaseAgent
+from benchmarks.stubs import StubGeminiService
+from services.diagnosis_cache import DiagnosisCache
+from services.translation_cache import TranslationCache
+from services.translation_service import TranslationService
+
+@pytest.fixture
+def agent(tmp_path, monkeypatch):
+    monkeypatch.setattr(disease_agent_module, "DiagnosisCache",
+                        lambda: DiagnosisCache(os.path.join(tmp_path, "diagnoses.sqlite3")))
+    gemini = StubGeminiService()
+    translation_service = TranslationService(gemini, TranslationCache(os.path.join(tmp_path, "translations.sqlite3")))
+    return DiseaseAgent(gemini, translation_service)
+
+def test_image_fallback_is_translated(agent, monkeypatch, capsys):
+    async def broken_lookup(image_data):
+        raise OSError("cannot identify image file")
+    monkeypatch.setattr(agent, "_lookup_image", broken_lookup)
+
+    english = asyncio.run(agent.diagnose_from_image(b"not an image"))
+    bangla = asyncio.run(agent.diagnose_from_image(b"not an image", language="bn"))
+
+    assert english.possible_diseases == ["Could not determine from image"]
+    # The stub translates by prefixing "[bn] "
+    assert bangla.possible_diseases == ["[bn] Could not determine from image"]
+    assert "cannot identify image file" in capsys.readouterr().out
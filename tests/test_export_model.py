@@ -0,0 +1,32 @@
+import os
+from export_model import expected_label, split_images, unquantized_path
+from image2disease import build_label_table, list_images
+
+TEST_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Test_image")
+LABELS = ["Apple___healthy", "Potato___Early_blight", "Potato___Late_blight", "Potato___healthy",
+          "Tomato___Bacterial_spot", "Tomato___Target_Spot", "Tomato___healthy"]
+
+def test_expected_label_from_file_name():
+    label_table = build_label_table(dict(enumerate(LABELS)))
+    expected = {os.path.basename(path): expected_label(path, label_table) for path in list_images(TEST_IMAGE)}
+    assert expected == {
+        "Potato_earli_bright.JPG": "Potato___Early_blight",
+        "Potato_late_bright.JPG": "Potato___Late_blight",
+        # Healthy, but no plant named: ambiguous, so not used for accuracy
+        "healthy_bright.JPG": None,
+        "tomato_bacterial_.JPG": "Tomato___Bacterial_spot",
+        "tomato_target_spot.JPG": "Tomato___Target_Spot"
+    }
+
+def test_calibration_and_evaluation_images_are_disjoint(tmp_path):
+    image_paths = list_images(TEST_IMAGE)
+    calibration, evaluation = split_images(image_paths)
+    assert not set(calibration) & set(evaluation)
+    assert sorted(calibration + evaluation) == image_paths
+
+    calibration, evaluation = split_images(image_paths, TEST_IMAGE)
+    assert calibration == [] and evaluation == image_paths
+
+def test_unquantized_export_path():
+    assert unquantized_path("models/classifier.int8.onnx") == "models/classifier.onnx"
+    assert unquantized_path("models/model.onnx") == "models/model.fp32.onnx"
@@ -0,0 +1,43 @@
+import asyncio
+import os
+import threading
+import pytest
+from services.geocoding_service import GeocodingService
+
+def test_memo_is_read_and_written_off_the_event_loop(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "geocode.sqlite3")
+    calls = []
+
+    async def fetch_json(url, params):
+        calls.append(params["q"])
+        return [{"lat": 23.8103, "lon": 90.4125, "name": "Dhaka", "country": "BD"}] if params["q"] == "dhaka" else []
+
+    first = GeocodingService(fetch_json, "key", path)
+    loop_threads = []
+    for name in ("_load", "_store"):
+        original = getattr(first, name)
+        def record(*args, original=original):
+            loop_threads.append(threading.current_thread() is threading.main_thread())
+            return original(*args)
+        monkeypatch.setattr(first, name, record)
+
+    async def run():
+        cell = await first.resolve("Dhaka City")
+        with pytest.raises(ValueError):
+            await first.resolve("Nowhereville")
+        with pytest.raises(ValueError):
+            await first.resolve("nowhereville")
+        # A new instance on the same file (a restart) resolves from SQLite
+        second = GeocodingService(fetch_json, "key", path)
+        try:
+            return cell, await second.resolve("dhaka")
+        finally:
+            second.close()
+
+    try:
+        cell, reloaded = asyncio.run(run())
+    finally:
+        first.close()
+    assert cell["key"] == reloaded["key"] == "23.8,90.4"
+    assert calls == ["dhaka", "nowhereville"]
+    assert loop_threads and not any(loop_threads)
@@ -0,0 +1,61 @@
+import io
+import itertools
+import os
+from PIL import Image
+from config import IMAGE_CACHE_MAX_DISTANCE
+from image2disease import _open_image, list_images
+from utils.image_fingerprint import DHASH_DRAFT_SIZE, ImageFingerprintCache, content_hash, dhash, hamming_distance
+
+TEST_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Test_image")
+
+def fingerprint(image_data):
+    return content_hash(image_data), dhash(_open_image(image_data, DHASH_DRAFT_SIZE))
+
+def lookup(cache, image_data):
+    digest, image_hash = fingerprint(image_data)
+    value = cache.get_exact(digest)
+    if value is None and cache.near_duplicates:
+        value = cache.get_similar(image_hash)
+    return value
+
+def load_test_images():
+    images = {}
+    for path in list_images(TEST_IMAGE):
+        with open(path, "rb") as f:
+            images[os.path.basename(path)] = f.read()
+    return images
+
+def encode(image, quality=85):
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+def test_distinct_photos_are_not_matched_at_the_default_distance():
+    images = load_test_images()
+    cache = ImageFingerprintCache(64, IMAGE_CACHE_MAX_DISTANCE)
+    for name, image_data in images.items():
+        assert lookup(cache, image_data) is None
+        cache.set(*fingerprint(image_data), name)
+    for name, image_data in images.items():
+        assert lookup(cache, image_data) == name
+
+    # A different leaf over the middle of a photo, on the same background
+    base = Image.open(io.BytesIO(images["healthy_bright.JPG"])).convert("RGB").resize((256, 256))
+    for name, image_data in images.items():
+        other = Image.open(io.BytesIO(image_data)).convert("RGB").resize((256, 256))
+        edited = base.copy()
+        edited.paste(other.crop((90, 90, 166, 166)), (90, 90))
+        assert lookup(cache, encode(edited)) is None
+
+def test_near_duplicate_matching_when_enabled():
+    images = load_test_images()
+    hashes = {name: fingerprint(image_data)[1] for name, image_data in images.items()}
+    # The bundled photos are all far apart
+    assert min(hamming_distance(hashes[a], hashes[b]) for a, b in itertools.combinations(hashes, 2)) > 16
+
+    cache = ImageFingerprintCache(64, 2)
+    for name, image_data in images.items():
+        cache.set(*fingerprint(image_data), name)
+    for name, image_data in images.items():
+        recompressed = encode(Image.open(io.BytesIO(image_data)).convert("RGB"))
+        assert lookup(cache, recompressed) == name
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import numpy as np
+import pytest
+import image2disease
+from services.inference_service import InferenceExecutor
+
+TEST_IMAGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Test_image")
+
+class FakeTransform:
+    draft_size = None
+
+    def __call__(self, images):
+        return np.zeros((len(images), 1), dtype=np.float32)
+
+class FakeBackend:
+    def predict(self, pixel_values):
+        return np.tile(np.array([[0.0, 2.0]], dtype=np.float32), (len(pixel_values), 1))
+
+@pytest.fixture
+def flaky_model(monkeypatch):
+    """get_model that fails on its first call, like an unreachable hub, and loads on the next"""
+    calls = []
+
+    def get_model():
+        calls.append(1)
+        if len(calls) == 1:
+            raise OSError("Hugging Face hub unreachable")
+        image2disease.transform = FakeTransform()
+        image2disease.backend = FakeBackend()
+        image2disease.id2label = {0: "Tomato___healthy", 1: "Tomato___Early_blight"}
+        return None, image2disease.backend
+
+    for name in ("transform", "backend", "id2label"):
+        monkeypatch.setattr(image2disease, name, None)
+    monkeypatch.setattr(image2disease, "get_model", get_model)
+    return calls
+
+def test_thread_pool_recovers_after_failed_model_load(flaky_model):
+    image_path = image2disease.list_images(TEST_IMAGE)[0]
+    with open(image_path, "rb") as f:
+        image_data = f.read()
+
+    async def classify_twice():
+        executor = InferenceExecutor(mode="thread", workers=1, torch_threads=1)
+        try:
+            with pytest.raises(OSError):
+                await executor.classify([image_data])
+            return await executor.classify([image_data])
+        finally:
+            executor.shutdown()
+
+    results = asyncio.run(classify_twice())
+    assert len(flaky_model) == 2
+    assert results[0][0][0] == "Tomato___Early_blight"
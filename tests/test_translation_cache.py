@@ -0,0 +1,33 @@
+import asyncio
+import os
+import threading
+from services.translation_cache import TranslationCache
+
+def test_sqlite_is_only_used_off_the_event_loop(tmp_path, monkeypatch):
+    path = os.path.join(tmp_path, "translations.sqlite3")
+    cache = TranslationCache(path, model="test-model")
+    loop_threads = []
+    for name in ("_load", "_store"):
+        original = getattr(cache, name)
+        def record(*args, original=original):
+            loop_threads.append(threading.current_thread() is threading.main_thread())
+            return original(*args)
+        monkeypatch.setattr(cache, name, record)
+
+    async def run():
+        await cache.set_many([("Water the plants.", "গাছে পানি দিন।"), ("Remove weeds.", "আগাছা পরিষ্কার করুন।")])
+        # Whitespace differences share one entry
+        in_memory = await cache.get_many(["Water the  plants.", "Unknown text."])
+        reopened = TranslationCache(path, model="test-model")
+        try:
+            return in_memory, await reopened.get_many(["Remove weeds.", "Unknown text."])
+        finally:
+            reopened.close()
+
+    try:
+        in_memory, from_disk = asyncio.run(run())
+    finally:
+        cache.close()
+    assert in_memory == {"Water the  plants.": "গাছে পানি দিন।"}
+    assert from_disk == {"Remove weeds.": "আগাছা পরিষ্কার করুন।"}
+    assert loop_threads and not any(loop_threads)
@@ -1,38 +1,105 @@
+# Package initialization
 import asyncio
+import os
+import sqlite3
+import threading
+import time
+from config import RATE_LIMIT_BACKEND, RATE_LIMIT_DB_PATH
+
+class MemoryRateLimitBackend:
+    """Keeps rate limit state in this process only"""
+    # reserve() only takes an uncontended in-process lock
+    blocking = False
+
+    def __init__(self):
+        self.next_times = {}
+        self.lock = threading.Lock()
+
+    def reserve(self, key: str, interval: float, burst: int) -> float:
+        """Reserve the next slot for key and return how long to wait for it"""
+        now = time.time()
+        with self.lock:
+            next_time = max(self.next_times.get(key, now), now) + interval
+            self.next_times[key] = next_time
+        return max(0.0, next_time - burst * interval - now)
+
+class SQLiteRateLimitBackend:
+    """
+    Keeps rate limit state in a SQLite file so that several uvicorn worker
+    processes on the same host share one limit
+    """
+    # reserve() may wait up to the busy timeout for other processes' write locks
+    blocking = True
+
+    def __init__(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Autocommit mode so we control the transactions ourselves
+        self.db = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS rate_limits (key TEXT PRIMARY KEY, next_time REAL)")
+        self.lock = threading.Lock()
+
+    def reserve(self, key: str, interval: float, burst: int) -> float:
+        """Reserve the next slot for key and return how long to wait for it"""
+        with self.lock:
+            # BEGIN IMMEDIATE takes the write lock, serializing reservations across processes
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                row = self.db.execute("SELECT next_time FROM rate_limits WHERE key = ?", (key,)).fetchone()
+                next_time = max(row[0] if row else now, now) + interval
+                self.db.execute("INSERT OR REPLACE INTO rate_limits (key, next_time) VALUES (?, ?)", (key, next_time))
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return max(0.0, next_time - burst * interval - now)
+
+rate_limit_backend = None
+
+def get_rate_limit_backend():
+    """Shared backend selected by RATE_LIMIT_BACKEND ("memory" or "sqlite")"""
+    global rate_limit_backend
+    if rate_limit_backend is None:
+        if RATE_LIMIT_BACKEND == "sqlite":
+            rate_limit_backend = SQLiteRateLimitBackend(RATE_LIMIT_DB_PATH)
+        elif RATE_LIMIT_BACKEND == "memory":
+            rate_limit_backend = MemoryRateLimitBackend()
+        else:
+            raise ValueError(f"Unknown rate limit backend: {RATE_LIMIT_BACKEND}")
+    return rate_limit_backend
 
 class RateLimiter:
     """
     A utility class to enforce rate limits for API calls
+    
+    Token bucket implemented as a virtual schedule (GCRA): tokens refill
+    continuously at rate_limit_per_minute and up to `burst` calls may go out
+    back to back. Each call reserves its slot in O(1) and then sleeps outside
+    any lock until the slot comes up, so waiters are served in arrival order
+    and a throttled caller never blocks the bookkeeping of others. Limiters
+    with the same key share one budget, across processes with the SQLite
+    backend.
     """
-    def __init__(self, rate_limit_per_minute: int):
-        self.rate_limit = rate_limit_per_minute
-        self.tokens = rate_limit_per_minute
-        self.last_refill = asyncio.get_event_loop().time()
-        self.lock = asyncio.Lock()
+    def __init__(self, rate_limit_per_minute: int, key: str = "default", burst: int = 1, backend=None):
+        self.rate_limit = max(1, rate_limit_per_minute)
+        self.interval = 60 / self.rate_limit
+        self.burst = max(1, min(burst, self.rate_limit))
+        self.key = key
+        self.backend = backend or get_rate_limit_backend()
 
     async def acquire(self):
         """
         Acquire a token to make an API call, waiting if necessary
         """
-        async with self.lock:
-            await self._refill()
-            if self.tokens <= 0:
-                # Calculate time until next token is available
-                refill_time = 60 / self.rate_limit
-                await asyncio.sleep(refill_time)
-                await self._refill()
-            
-            self.tokens -= 1
-
-    async def _refill(self):
-        """
-        Refill tokens based on elapsed time
-        """
-        now = asyncio.get_event_loop().time()
-        elapsed = now - self.last_refill
-        
-        # Calculate how many tokens to add based on elapsed time
-        new_tokens = int(elapsed * (self.rate_limit / 60))
-        if new_tokens > 0:
-            self.tokens = min(self.tokens + new_tokens, self.rate_limit)
-            self.last_refill = now
+        if getattr(self.backend, "blocking", False):
+            # Keep the event loop free while waiting on the database lock
+            wait_time = await asyncio.get_running_loop().run_in_executor(
+                None, self.backend.reserve, self.key, self.interval, self.burst
+            )
+        else:
+            wait_time = self.backend.reserve(self.key, self.interval, self.burst)
+        if wait_time > 0:
+            await asyncio.sleep(wait_time)
@@ -0,0 +1,176 @@
+import numpy as np
+from typing import Any, Dict, List, Optional
+
+SECONDS_PER_DAY = 86400
+# Base temperature for growing degree days, suitable for most warm-season crops
+GDD_BASE_TEMPERATURE = 10.0
+PRECIPITATION_CONDITIONS = ("Rain", "Snow", "Drizzle", "Thunderstorm")
+
+class ForecastArrays:
+    """
+    Column-oriented view of an OpenWeatherMap 3-hourly forecast, built once
+    from the raw JSON so that all aggregation runs as vectorized NumPy passes
+    """
+    def __init__(self, weather_data: Dict[str, Any]):
+        slots = weather_data.get("list") or []
+        city = weather_data.get("city") or {}
+        n = len(slots)
+
+        # Offset from UTC in seconds, so days are bucketed in the location's timezone
+        self.timezone_offset = int(city.get("timezone") or 0)
+        self.latitude = (city.get("coord") or {}).get("lat")
+
+        self.dt = np.fromiter((slot["dt"] for slot in slots), dtype=np.int64, count=n)
+        self.temp = np.fromiter((slot["main"]["temp"] for slot in slots), dtype=np.float64, count=n)
+        self.temp_max = np.fromiter((slot["main"]["temp_max"] for slot in slots), dtype=np.float64, count=n)
+        self.temp_min = np.fromiter((slot["main"]["temp_min"] for slot in slots), dtype=np.float64, count=n)
+        self.humidity = np.fromiter((slot["main"].get("humidity", np.nan) for slot in slots), dtype=np.float64, count=n)
+        self.pop = np.fromiter((slot.get("pop", 0) for slot in slots), dtype=np.float64, count=n)
+        self.precipitation = np.fromiter(
+            ((slot.get("rain") or {}).get("3h", 0) + (slot.get("snow") or {}).get("3h", 0) for slot in slots),
+            dtype=np.float64, count=n
+        )
+        self.description = np.array(
+            [slot["weather"][0]["description"] if slot.get("weather") else "No data" for slot in slots],
+            dtype=object
+        )
+        self.precipitating = np.fromiter(
+            ("rain" in slot or any(w.get("main") in PRECIPITATION_CONDITIONS for w in slot.get("weather") or [])
+             for slot in slots),
+            dtype=bool, count=n
+        )
+
+        # Local calendar day number of each slot (days since the epoch)
+        self.day = (self.dt + self.timezone_offset) // SECONDS_PER_DAY
+        if n and np.any(np.diff(self.day) < 0):
+            order = np.argsort(self.dt, kind="stable")
+            for name in ("dt", "temp", "temp_max", "temp_min", "humidity", "pop",
+                         "precipitation", "description", "precipitating", "day"):
+                setattr(self, name, getattr(self, name)[order])
+
+    def __len__(self) -> int:
+        return len(self.dt)
+
+def slice_forecast(weather_data: Dict[str, Any], days: Optional[int]) -> Dict[str, Any]:
+    """
+    Restrict a raw forecast response to its first `days` local calendar days
+
+    Returns a shallow copy; the cached full-horizon response is not modified.
+    """
+    slots = (weather_data or {}).get("list") or []
+    if days is None or not slots:
+        return weather_data
+    offset = int((weather_data.get("city") or {}).get("timezone") or 0)
+    last_day = (slots[0]["dt"] + offset) // SECONDS_PER_DAY + max(0, days)
+    sliced = dict(weather_data)
+    sliced["list"] = [slot for slot in slots if (slot["dt"] + offset) // SECONDS_PER_DAY < last_day]
+    sliced["cnt"] = len(sliced["list"])
+    return sliced
+
+def extraterrestrial_radiation(latitude: float, day_of_year: np.ndarray) -> np.ndarray:
+    """Daily extraterrestrial radiation Ra in MJ/m²/day (FAO-56, eq. 21)"""
+    phi = np.radians(latitude)
+    dr = 1 + 0.033 * np.cos(2 * np.pi * day_of_year / 365)
+    delta = 0.409 * np.sin(2 * np.pi * day_of_year / 365 - 1.39)
+    omega = np.arccos(np.clip(-np.tan(phi) * np.tan(delta), -1.0, 1.0))
+    return (24 * 60 / np.pi) * 0.0820 * dr * (
+        omega * np.sin(phi) * np.sin(delta) + np.cos(phi) * np.cos(delta) * np.sin(omega)
+    )
+
+class DailyForecast:
+    """Daily aggregates computed from ForecastArrays"""
+    def __init__(self, arrays: ForecastArrays, gdd_base: float = GDD_BASE_TEMPERATURE):
+        self.slot_count = len(arrays)
+        self.mean_slot_temperature = float(arrays.temp.mean()) if self.slot_count else None
+
+        if not self.slot_count:
+            empty = np.array([], dtype=np.float64)
+            self.dates = []
+            self.temperature_high = self.temperature_low = self.temperature_mean = empty
+            self.precipitation_chance = self.precipitation_total = self.humidity_mean = empty
+            self.growing_degree_days = self.et0 = empty
+            self.precipitating = np.array([], dtype=bool)
+            self.description = np.array([], dtype=object)
+            return
+
+        # Slots are sorted by time, so each day is a contiguous run starting at `starts`
+        days, starts, counts = np.unique(arrays.day, return_index=True, return_counts=True)
+        local_dates = days.astype("datetime64[D]")
+        self.dates = [str(date) for date in local_dates]
+
+        self.temperature_high = np.maximum.reduceat(arrays.temp_max, starts)
+        self.temperature_low = np.minimum.reduceat(arrays.temp_min, starts)
+        self.temperature_mean = np.add.reduceat(arrays.temp, starts) / counts
+        self.precipitation_chance = np.maximum.reduceat(arrays.pop, starts)
+        self.precipitation_total = np.add.reduceat(arrays.precipitation, starts)
+        self.precipitating = np.logical_or.reduceat(arrays.precipitating, starts)
+        humidity = np.nan_to_num(arrays.humidity)
+        humidity_counts = np.add.reduceat(~np.isnan(arrays.humidity), starts)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            self.humidity_mean = np.add.reduceat(humidity, starts) / humidity_counts
+        # The first slot of the day describes the day, as before
+        self.description = arrays.description[starts]
+
+        # Agronomic extras
+        daily_mean = (self.temperature_high + self.temperature_low) / 2
+        self.growing_degree_days = np.maximum(0.0, daily_mean - gdd_base)
+        if arrays.latitude is not None:
+            # Hargreaves reference evapotranspiration in mm/day
+            day_of_year = (local_dates - local_dates.astype("datetime64[Y]")).astype(np.int64) + 1
+            radiation = 0.408 * extraterrestrial_radiation(arrays.latitude, day_of_year)
+            temperature_range = np.maximum(0.0, self.temperature_high - self.temperature_low)
+            self.et0 = 0.0023 * (daily_mean + 17.8) * np.sqrt(temperature_range) * radiation
+        else:
+            self.et0 = np.full(len(days), np.nan)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def to_daily_records(self) -> List[Dict[str, Any]]:
+        """One plain-Python dict per day, ready for JSON and the response models"""
+        records = []
+        for i, date in enumerate(self.dates):
+            records.append({
+                "date": date,
+                "temperature_high": float(self.temperature_high[i]),
+                "temperature_low": float(self.temperature_low[i]),
+                "precipitation_chance": float(self.precipitation_chance[i]),
+                "description": self.description[i],
+                "precipitation_mm": round(float(self.precipitation_total[i]), 1),
+                "humidity": _optional_round(self.humidity_mean[i], 0),
+                "growing_degree_days": round(float(self.growing_degree_days[i]), 1),
+                "et0_mm": _optional_round(self.et0[i], 1)
+            })
+        return records
+
+    def summary(self) -> str:
+        """Human-readable summary used in prompts"""
+        if not self.slot_count:
+            return "No forecast data available"
+
+        summary = (f"Average temperature: {self.mean_slot_temperature:.1f}°C "
+                   f"(Range: {self.temperature_low.min():.1f}°C to {self.temperature_high.max():.1f}°C). ")
+        summary += (f"Precipitation expected on {int(self.precipitating.sum())} out of {len(self)} days "
+                    f"(total {self.precipitation_total.sum():.1f} mm). ")
+        summary += f"Growing degree days (base {GDD_BASE_TEMPERATURE:.0f}°C): {self.growing_degree_days.sum():.1f}."
+        if not np.all(np.isnan(self.et0)):
+            summary += f" Reference evapotranspiration (ET0): {np.nansum(self.et0):.1f} mm."
+        return summary
+
+def _optional_round(value, digits: int) -> Optional[float]:
+    value = float(value)
+    if np.isnan(value):
+        return None
+    return round(value, digits) if digits else float(round(value))
+
+def aggregate_forecast(weather_data: Dict[str, Any]) -> DailyForecast:
+    """
+    Turn a raw OpenWeatherMap forecast response into daily aggregates
+
+    Args:
+        weather_data: Raw /forecast response
+
+    Returns:
+        DailyForecast: Vectorized daily aggregates
+    """
+    return DailyForecast(ForecastArrays(weather_data or {}))
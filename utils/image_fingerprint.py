@@ -0,0 +1,140 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+import numpy as np
+from PIL import Image
+from utils.metrics import metrics
+
+DHASH_SIZE = 8
+DHASH_BITS = DHASH_SIZE * DHASH_SIZE
+# Smallest decode that still covers the dHash thumbnail
+DHASH_DRAFT_SIZE = (DHASH_SIZE + 1, DHASH_SIZE)
+
+def content_hash(data: bytes) -> str:
+    """SHA-256 of the encoded image bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+def dhash(image: Image.Image, size: int = DHASH_SIZE) -> int:
+    """
+    Difference hash of a decoded image: compares neighbouring pixels of a
+    tiny grayscale thumbnail, so it survives recompression, resizing and
+    small colour shifts
+
+    Returns:
+        int: A size*size bit hash
+    """
+    pixels = np.asarray(image.convert("L").resize((size + 1, size), Image.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), "big")
+
+if hasattr(int, "bit_count"):
+    def hamming_distance(a: int, b: int) -> int:
+        return (a ^ b).bit_count()
+else:
+    # Python < 3.10
+    def hamming_distance(a: int, b: int) -> int:
+        return bin(a ^ b).count("1")
+
+class ImageFingerprintCache:
+    """
+    LRU cache keyed by image fingerprints: an exact content hash, with a
+    fallback to the closest perceptual hash within max_distance bits, so
+    re-uploads and recompressed copies of a photo map to the same entry.
+    A negative max_distance disables the fallback (exact matches only).
+
+    Near-duplicate lookups don't scan the cache. Each perceptual hash is cut
+    into max_distance + 1 bit ranges and indexed by each range's value. Two
+    hashes at most max_distance bits apart must agree exactly on at least
+    one range (pigeonhole), so only entries sharing a bucket are compared.
+    """
+    def __init__(self, max_entries: int, max_distance: int, hash_bits: int = DHASH_BITS):
+        self.max_entries = max(1, max_entries)
+        self.max_distance = max_distance
+        self.near_duplicates = max_distance >= 0
+        parts = min(max_distance + 1, hash_bits) if max_distance >= 0 else 0
+        # (shift, mask) of each indexed bit range
+        self.ranges = []
+        for i in range(parts):
+            start, end = hash_bits * i // parts, hash_bits * (i + 1) // parts
+            self.ranges.append((start, (1 << (end - start)) - 1))
+        # content hash -> (perceptual hash, value), least recently used first
+        self.entries = OrderedDict()
+        # (range number, range value) -> content hashes
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.exact_hits = metrics.counter("image_cache_exact_hits")
+        self.near_hits = metrics.counter("image_cache_near_hits")
+        self.misses = metrics.counter("image_cache_misses")
+        self.near_hit_rate = metrics.gauge("image_cache_near_hit_rate")
+
+    def _bucket_keys(self, image_hash: Optional[int]):
+        if image_hash is None:
+            return []
+        return [(i, (image_hash >> shift) & mask) for i, (shift, mask) in enumerate(self.ranges)]
+
+    def _update_rate(self):
+        lookups = self.exact_hits.value + self.near_hits.value + self.misses.value
+        if lookups:
+            self.near_hit_rate.set(self.near_hits.value / lookups)
+
+    def get_exact(self, digest: str) -> Optional[Any]:
+        """Value stored for exactly these bytes; misses aren't counted until get_similar"""
+        with self.lock:
+            entry = self.entries.get(digest)
+            if entry is None:
+                return None
+            self.entries.move_to_end(digest)
+        self.exact_hits.inc()
+        self._update_rate()
+        return entry[1]
+
+    def record_miss(self):
+        """Count a lookup that found nothing without a perceptual hash lookup"""
+        self.misses.inc()
+        self._update_rate()
+
+    def get_similar(self, image_hash: int) -> Optional[Any]:
+        """Value of the perceptually closest image within max_distance bits"""
+        best_key, best_distance = None, self.max_distance + 1
+        with self.lock:
+            candidates = set()
+            for bucket_key in self._bucket_keys(image_hash):
+                candidates.update(self.buckets.get(bucket_key, ()))
+            for key in candidates:
+                distance = hamming_distance(image_hash, self.entries[key][0])
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is not None:
+                self.entries.move_to_end(best_key)
+                value = self.entries[best_key][1]
+
+        if best_key is None:
+            self.record_miss()
+            return None
+        self.near_hits.inc()
+        self._update_rate()
+        return value
+
+    def set(self, digest: str, image_hash: Optional[int], value: Any):
+        with self.lock:
+            if digest in self.entries:
+                self._unindex(digest)
+            self.entries[digest] = (image_hash, value)
+            for bucket_key in self._bucket_keys(image_hash):
+                self.buckets.setdefault(bucket_key, set()).add(digest)
+            while len(self.entries) > self.max_entries:
+                self._unindex(next(iter(self.entries)))
+
+    def _unindex(self, digest: str):
+        """Remove an entry and its index buckets (lock held)"""
+        image_hash, _ = self.entries.pop(digest)
+        for bucket_key in self._bucket_keys(image_hash):
+            bucket = self.buckets.get(bucket_key)
+            if bucket is not None:
+                bucket.discard(digest)
+                if not bucket:
+                    del self.buckets[bucket_key]
+
+    def __len__(self) -> int:
+        return len(self.entries)
@@ -0,0 +1,112 @@
+import threading
+from typing import Dict, Any, Iterable
+
+
+class Counter:
+    """A monotonically increasing counter"""
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "counter", "value": self.value}
+
+
+class Gauge:
+    """A value that can go up and down (queue depths, in-flight work)"""
+    def __init__(self, name: str):
+        self.name = name
+        self.value = 0
+        self.lock = threading.Lock()
+
+    def set(self, value: float):
+        with self.lock:
+            self.value = value
+
+    def inc(self, amount: float = 1):
+        with self.lock:
+            self.value += amount
+
+    def dec(self, amount: float = 1):
+        with self.lock:
+            self.value -= amount
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "gauge", "value": self.value}
+
+
+class Histogram:
+    """A fixed-bucket histogram with cumulative bucket counts"""
+    def __init__(self, name: str, buckets: Iterable[float]):
+        self.name = name
+        self.buckets = sorted(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value: float):
+        with self.lock:
+            index = len(self.buckets)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    index = i
+                    break
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            cumulative = 0
+            buckets = {}
+            for bound, count in zip(self.buckets, self.counts):
+                cumulative += count
+                buckets[str(bound)] = cumulative
+            buckets["+Inf"] = self.count
+            return {
+                "type": "histogram",
+                "count": self.count,
+                "sum": self.sum,
+                "mean": self.sum / self.count if self.count else 0.0,
+                "buckets": buckets
+            }
+
+
+class MetricsRegistry:
+    """
+    Process-wide registry of named metrics, exposed through the /metrics endpoint
+    """
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory):
+        with self.lock:
+            metric = self.metrics.get(name)
+            if metric is None:
+                metric = factory()
+                self.metrics[name] = metric
+            return metric
+
+    def counter(self, name: str) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name))
+
+    def gauge(self, name: str) -> Gauge:
+        return self._get_or_create(name, lambda: Gauge(name))
+
+    def histogram(self, name: str, buckets: Iterable[float]) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, buckets))
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self.lock:
+            metrics = list(self.metrics.items())
+        return {name: metric.snapshot() for name, metric in sorted(metrics)}
+
+
+metrics = MetricsRegistry()
@@ -1,3 +1,8 @@
+import json
+import textwrap
+from dataclasses import dataclass
+from typing import Any, Dict
+
 class PromptTemplates:
     DISEASE_DIAGNOSIS = """
     As a plant disease expert, analyze the following information:
@@ -49,3 +54,42 @@ class PromptTemplates:
     
     Format your response in a clear, structured manner.
     """
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    """Generation settings for one prompt template; the name keys its metrics"""
+    name: str
+    max_output_tokens: int
+    temperature: float
+    top_p: float = 0.95
+    top_k: int = 40
+
+    def generation_config(self) -> Dict[str, Any]:
+        return {
+            "temperature": self.temperature,
+            "top_p": self.top_p,
+            "top_k": self.top_k,
+            "max_output_tokens": self.max_output_tokens,
+        }
+
+class PromptProfiles:
+    # Free-form calls without a template of their own
+    DEFAULT = GenerationProfile("default", max_output_tokens=1024, temperature=0.7)
+    # JSON answers: a lower temperature keeps them on schema
+    DISEASE_DIAGNOSIS = GenerationProfile("disease_diagnosis", max_output_tokens=768, temperature=0.4)
+    PLANTING_PLAN = GenerationProfile("planting_plan", max_output_tokens=1024, temperature=0.5)
+    WEATHER_INTERPRETATION = GenerationProfile("weather_interpretation", max_output_tokens=768, temperature=0.6)
+    # Translations should be faithful, not creative. Bangla needs several
+    # tokens per English word, so batched calls get a larger budget.
+    TRANSLATION = GenerationProfile("translation", max_output_tokens=512, temperature=0.2)
+    BATCH_TRANSLATION = GenerationProfile("batch_translation", max_output_tokens=4096, temperature=0.2)
+    UI_TRANSLATION = GenerationProfile("ui_translation", max_output_tokens=2048, temperature=0.2)
+
+def compact_json(data: Any) -> str:
+    """Serialize prompt input data without indentation or padding whitespace"""
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+def compact_text(text: str) -> str:
+    """Strip the source-code indentation from a triple-quoted prompt"""
+    return textwrap.dedent(text).strip()
@@ -0,0 +1,26 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    work, everyone else arriving while it is in flight awaits the same result
+    """
+    def __init__(self):
+        self.in_flight: Dict[Hashable, asyncio.Future] = {}
+
+    def _forget(self, key, future):
+        if self.in_flight.get(key) is future:
+            del self.in_flight[key]
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        future = self.in_flight.get(key)
+        if future is not None:
+            # shield: one waiter being cancelled must not cancel the shared work
+            return await asyncio.shield(future)
+        
+        future = asyncio.ensure_future(fn())
+        self.in_flight[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return await asyncio.shield(future)
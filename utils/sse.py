@@ -0,0 +1,10 @@
+import json
+from typing import Any
+
+
+def format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Event with a JSON payload"""
+    payload = json.dumps(data, ensure_ascii=False)
+    # Each line of the payload needs its own data: prefix
+    lines = "".join(f"data: {line}\n" for line in payload.split("\n"))
+    return f"event: {event}\n{lines}\n"
@@ -0,0 +1,73 @@
+import os
+from fastapi import HTTPException
+from starlette.responses import JSONResponse
+from config import UPLOAD_MAX_BYTES
+
+# Room for multipart boundaries and part headers around the file itself
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+class UploadTooLargeError(ValueError):
+    """Raised when an upload exceeds the configured maximum size"""
+
+def open_upload(upload, max_bytes: int = UPLOAD_MAX_BYTES):
+    """
+    The file behind an upload, rewound, after checking its size
+
+    The multipart parser has already spooled the upload (in memory, or on
+    disk when large), so it is used as is rather than copied again.
+
+    Args:
+        upload: A FastAPI UploadFile
+        max_bytes: Maximum accepted size (0 for no limit)
+
+    Raises:
+        UploadTooLargeError: If the upload is larger than max_bytes
+    """
+    file = upload.file
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    if max_bytes and size > max_bytes:
+        raise UploadTooLargeError(f"Upload too large: {size} bytes (maximum {max_bytes})")
+    return file
+
+class BodySizeLimitMiddleware:
+    """
+    Rejects oversized request bodies on upload endpoints before they are
+    parsed: up front from Content-Length, or, for chunked bodies, as soon as
+    more than the limit has been received
+    """
+    def __init__(self, app, limits: dict):
+        """
+        Args:
+            app: The ASGI application
+            limits: Maximum body size in bytes per request path
+        """
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" else None
+        if not limit:
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body too large: at most {limit} bytes"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing, which passes HTTPExceptions through
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)